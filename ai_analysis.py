@@ -1,12 +1,101 @@
 """
 AI-powered post-prediction analysis using Groq or OpenAI
+
+Interpretations are cached per (provider, model, class, confidence bucket);
+fill every bucket ahead of time, or interpret a whole score_images run, with:
+
+    python ai_analysis.py prewarm
+    python ai_analysis.py bulk scores.jsonl --output analyses.jsonl
 """
 
+import argparse
+import asyncio
+import csv
+import json
 import os
-from dotenv import load_dotenv
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis_cache import AnalysisCache, confidence_bucket
+from llm_router import ProviderRouter, TokenBucket
+
+GROQ_MODEL = "llama-3.3-70b-versatile"
+OPENAI_MODEL = "gpt-3.5-turbo"
+PROVIDER_MODELS = {'groq': GROQ_MODEL, 'openai': OPENAI_MODEL}
+
+# HTTP client settings shared by every provider
+CONNECT_TIMEOUT_S = 3.0
+READ_TIMEOUT_S = 20.0
+POOL_CONNECTIONS = 10
+
+# Retries of connection errors, timeouts, 429 and 5xx responses
+MAX_RETRIES = 2
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 4.0
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Bulk interpretation: concurrent requests, and the provider rate limit
+# (requests per second, burst) they are paced to
+BULK_CONCURRENCY = 8
+RATE_LIMIT_BURST = 5
+
+# Documented request limits of each provider's model, in requests per second:
+# Groq free tier 30 requests/min, OpenAI usage tier 1 3,500 requests/min.
+# SPINE_ANALYSIS_RPS overrides them (e.g. for a paid Groq plan).
+PROVIDER_RATE_LIMITS_RPS = {'groq': 30 / 60, 'openai': 3500 / 60}
+
+ERROR_PREFIX = "⚠️ Error getting AI analysis"
+
+# Set SPINE_ANALYSIS_CACHE=0 to always call the provider
+ANALYSIS_CACHE = os.getenv('SPINE_ANALYSIS_CACHE', '1') == '1'
+
+_analysis_cache = None
+_analysis_cache_lock = threading.Lock()
+
+_router = None
+_router_providers = None
+_router_lock = threading.Lock()
+
+_env_loaded = False
+
+
+def _load_env():
+    """Read .env into the environment the first time an API key is looked up."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+def get_analysis_cache():
+    """Process-wide interpretation cache, opened on first use (None if disabled)."""
+    global _analysis_cache
+    if not ANALYSIS_CACHE:
+        return None
+    with _analysis_cache_lock:
+        if _analysis_cache is None:
+            _analysis_cache = AnalysisCache()
+        return _analysis_cache
+
+
+def default_rate_limit():
+    """Bulk request rate: SPINE_ANALYSIS_RPS, else the primary provider's documented limit."""
+    _load_env()
+    rate = os.getenv('SPINE_ANALYSIS_RPS')
+    if rate:
+        return float(rate)
+    providers = _configured_providers()
+    return PROVIDER_RATE_LIMITS_RPS[providers[0][0] if providers else 'groq']
 
-# Load environment variables
-load_dotenv()
+
+def _cache_key(provider, prediction, bucket):
+    return (provider, PROVIDER_MODELS[provider], prediction, bucket)
 
 
 def get_ai_analysis(prediction, confidence_score):
@@ -20,27 +109,292 @@ def get_ai_analysis(prediction, confidence_score):
     Returns:
         str: AI-generated analysis or None if API key not configured
     """
-    # Check for Groq API key first (recommended)
+    router = get_router()
+    if router is None:
+        return None
+
+    try:
+        return _analysis(router, prediction, confidence_bucket(confidence_score))
+    except Exception as e:
+        return f"{ERROR_PREFIX}: {str(e)}"
+
+
+async def get_ai_analysis_async(prediction, confidence_score, executor=None):
+    """
+    Asyncio variant of get_ai_analysis.
+
+    Cache hits are answered on the event loop; provider requests run on
+    `executor` (the loop's default executor if None) through the same
+    router, retries and cache as the blocking call.
+    """
+    router = get_router()
+    if router is None:
+        return None
+
+    bucket = confidence_bucket(confidence_score)
+    cached = _cached_analysis(router, prediction, bucket)
+    if cached is not None:
+        return cached
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(executor, _analysis, router, prediction, bucket)
+    except Exception as e:
+        return f"{ERROR_PREFIX}: {str(e)}"
+
+
+async def get_ai_analysis_bulk_async(predictions, concurrency=BULK_CONCURRENCY,
+                                     requests_per_second=None,
+                                     burst=RATE_LIMIT_BURST):
+    """
+    Interpret many predictions concurrently.
+
+    Identical (class, confidence bucket) pairs share one request, cache hits
+    skip the provider, and provider requests are limited to `concurrency`
+    at a time and paced by a token bucket.
+
+    Args:
+        predictions: Sequence of (predicted class, confidence) pairs
+        concurrency: Maximum provider requests in flight
+        requests_per_second: Sustained provider request rate (None for
+            default_rate_limit())
+        burst: Requests allowed back to back before pacing starts
+
+    Returns:
+        List of analyses (or error messages) in input order; all None if no
+        API key is configured
+    """
+    predictions = list(predictions)
+    router = get_router()
+    if router is None:
+        return [None] * len(predictions)
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    rate_limit = TokenBucket(requests_per_second or default_rate_limit(), burst)
+
+    async def fetch(prediction, bucket):
+        cached = _cached_analysis(router, prediction, bucket)
+        if cached is not None:
+            return cached
+        async with semaphore:
+            await rate_limit.acquire()
+            try:
+                return await loop.run_in_executor(executor, _analysis, router, prediction, bucket)
+            except Exception as e:
+                return f"{ERROR_PREFIX}: {str(e)}"
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ai-bulk') as executor:
+        in_flight = {}
+        for prediction, confidence_score in predictions:
+            key = (prediction, confidence_bucket(confidence_score))
+            if key not in in_flight:
+                in_flight[key] = asyncio.ensure_future(fetch(*key))
+        return list(await asyncio.gather(*[
+            in_flight[(prediction, confidence_bucket(confidence_score))]
+            for prediction, confidence_score in predictions
+        ]))
+
+
+def get_ai_analysis_bulk(predictions, **options):
+    """Blocking wrapper around get_ai_analysis_bulk_async (see it for options)."""
+    return asyncio.run(get_ai_analysis_bulk_async(predictions, **options))
+
+
+def _analysis(router, prediction, bucket):
+    """Cached or freshly generated interpretation for one bucket (raises on failure)."""
+    cached = _cached_analysis(router, prediction, bucket)
+    if cached is not None:
+        return cached
+
+    provider, analysis = router.call(prediction, bucket / 1000)
+
+    cache = get_analysis_cache()
+    if cache is not None and analysis:
+        cache.put(_cache_key(provider, prediction, bucket), analysis)
+    return analysis
+
+
+def _cached_analysis(router, prediction, bucket):
+    """Cached interpretation from any configured provider (fastest first), or None."""
+    cache = get_analysis_cache()
+    if cache is None:
+        return None
+    for provider in router.ranked() or router.calls:
+        cached = cache.get(_cache_key(provider, prediction, bucket))
+        if cached is not None:
+            return cached
+    return None
+
+
+def _configured_providers():
+    """List of (provider, api_key) for every configured provider, Groq first."""
+    _load_env()
+    providers = []
     groq_api_key = os.getenv('GROQ_API_KEY')
     openai_api_key = os.getenv('OPENAI_API_KEY')
-    
+
     if groq_api_key and groq_api_key != 'your_groq_api_key_here':
-        return _get_groq_analysis(prediction, confidence_score, groq_api_key)
-    elif openai_api_key and openai_api_key != 'your_openai_api_key_here':
-        return _get_openai_analysis(prediction, confidence_score, openai_api_key)
-    else:
+        providers.append(('groq', groq_api_key))
+    if openai_api_key and openai_api_key != 'your_openai_api_key_here':
+        providers.append(('openai', openai_api_key))
+    return providers
+
+
+def get_router():
+    """
+    Process-wide ProviderRouter over the configured providers (None if none are).
+
+    With both keys set, requests go to the faster healthy provider and slow
+    ones are hedged to the other; see llm_router.
+    """
+    global _router, _router_providers
+    providers = _configured_providers()
+    if not providers:
         return None
+    with _router_lock:
+        if _router is None or _router_providers != providers:
+            _router = ProviderRouter(
+                {name: _bind_key(_PROVIDERS[name], key) for name, key in providers},
+                streams={name: _bind_key(_STREAMING_PROVIDERS[name], key)
+                         for name, key in providers},
+            )
+            _router_providers = providers
+        return _router
 
 
-def _get_groq_analysis(prediction, confidence_score, api_key):
-    """Get analysis using Groq API (Fast & Free)."""
+def _bind_key(provider_fn, api_key):
+    return lambda prediction, confidence_score: provider_fn(prediction, confidence_score, api_key)
+
+
+def stream_ai_analysis(prediction, confidence_score):
+    """
+    Stream the AI analysis as text chunks while the provider generates it.
+
+    A cached interpretation is yielded as a single chunk; a fully streamed
+    one is added to the cache.
+
+    Args:
+        prediction: The predicted class (e.g., "with_pain", "without_pain")
+        confidence_score: The confidence score (0-1)
+
+    Yields:
+        str: Successive pieces of the analysis (nothing if no API key is configured)
+    """
+    router = get_router()
+    if router is None:
+        return
+
+    bucket = confidence_bucket(confidence_score)
+    cached = _cached_analysis(router, prediction, bucket)
+    if cached is not None:
+        yield cached
+        return
+
+    chunks = []
     try:
-        from groq import Groq
-        
-        client = Groq(api_key=api_key)
-        
-        # Create prompt for analysis
-        prompt = f"""You are a medical AI assistant analyzing spinal MRI scan results. 
+        provider, stream = router.open_stream(prediction, bucket / 1000)
+        for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+    except Exception as e:
+        yield f"{ERROR_PREFIX}: {str(e)}"
+        return
+
+    cache = get_analysis_cache()
+    if cache is not None and chunks:
+        cache.put(_cache_key(provider, prediction, bucket), ''.join(chunks))
+
+
+def prewarm_buckets(class_names, min_confidence=0.5):
+    """Every (class, confidence bucket) pair the model can produce."""
+    return [(prediction, bucket)
+            for prediction in class_names
+            for bucket in range(confidence_bucket(min_confidence), 1001)]
+
+
+def prewarm_analysis_cache(class_names, min_confidence=0.5, concurrency=BULK_CONCURRENCY,
+                           requests_per_second=None):
+    """
+    Fill every missing (class, confidence bucket) entry through the bulk API.
+
+    Args:
+        class_names: Classes the model can predict
+        min_confidence: Lowest confidence the top class can have (1 / number of classes)
+        concurrency: Maximum provider requests in flight
+        requests_per_second: Provider rate limit (None for default_rate_limit())
+
+    Returns:
+        Dict with the number of buckets fetched, already cached and failed
+    """
+    providers = [name for name, _ in _configured_providers()]
+    cache = get_analysis_cache()
+    if not providers or cache is None:
+        raise RuntimeError("Pre-warming needs a configured API key and SPINE_ANALYSIS_CACHE=1")
+
+    buckets = prewarm_buckets(class_names, min_confidence)
+    pending = [(prediction, bucket) for prediction, bucket in buckets
+               if not any(_cache_key(provider, prediction, bucket) in cache
+                          for provider in providers)]
+
+    results = get_ai_analysis_bulk([(prediction, bucket / 1000) for prediction, bucket in pending],
+                                   concurrency=concurrency,
+                                   requests_per_second=requests_per_second)
+    failed = sum(1 for result in results if not result or result.startswith(ERROR_PREFIX))
+    return {'fetched': len(pending) - failed, 'cached': len(buckets) - len(pending),
+            'failed': failed}
+
+
+def _read_scores(path):
+    """Rows of a score_images JSONL/CSV output that carry a label."""
+    with open(path, 'r', newline='') as f:
+        if path.lower().endswith('.csv'):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    return [row for row in rows if row.get('label')]
+
+
+def stream_with_deadline(chunks, deadline_s):
+    """
+    Consume a chunk iterator on a background thread, yielding chunks as they arrive.
+
+    Raises TimeoutError once `deadline_s` seconds have passed without the
+    stream finishing; the background thread is left to finish on its own.
+    """
+    chunk_queue = queue.Queue()
+    finished = object()
+
+    def pump():
+        try:
+            for chunk in chunks:
+                chunk_queue.put(chunk)
+        except Exception as e:
+            chunk_queue.put(e)
+        finally:
+            chunk_queue.put(finished)
+
+    threading.Thread(target=pump, name='ai-analysis', daemon=True).start()
+
+    deadline = time.monotonic() + deadline_s
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            if remaining <= 0:
+                raise queue.Empty
+            item = chunk_queue.get(timeout=remaining)
+        except queue.Empty:
+            raise TimeoutError(f"AI analysis did not finish within {deadline_s:g} s")
+        if item is finished:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def _build_messages(prediction, confidence_score):
+    """Chat messages shared by every provider."""
+    prompt = f"""You are a medical AI assistant analyzing spinal MRI scan results. 
         
 Result: {prediction.replace('_', ' ').title()}
 Confidence: {confidence_score:.1%}
@@ -52,74 +406,141 @@ Provide a brief, professional analysis (2-3 sentences) covering:
 
 Keep it concise, educational, and appropriate for students learning about AI in healthcare."""
 
-        # Call Groq API
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful medical AI assistant providing educational analysis of diagnostic results."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            model="llama-3.3-70b-versatile",  # Fast and accurate
-            temperature=0.7,
-            max_completion_tokens=200,
-        )
-        
-        return chat_completion.choices[0].message.content
-        
-    except Exception as e:
-        return f"⚠️ Error getting AI analysis: {str(e)}"
+    return [
+        {
+            "role": "system",
+            "content": "You are a helpful medical AI assistant providing educational analysis of diagnostic results."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+
+def _retry_delay(attempt):
+    """Exponential backoff with jitter, capped at BACKOFF_MAX_S."""
+    delay = min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _is_retryable(error):
+    """Connection failures, timeouts, 408/409/429 and 5xx responses are worth retrying."""
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    # Both SDKs raise APIConnectionError (and its APITimeoutError subclass)
+    return any(cls.__name__ == 'APIConnectionError' for cls in type(error).__mro__)
+
+
+def _with_retries(request, retries=None):
+    """Call `request()`, retrying retryable failures with bounded exponential backoff."""
+    retries = MAX_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            return request()
+        except Exception as e:
+            if attempt == retries or not _is_retryable(e):
+                raise
+            time.sleep(_retry_delay(attempt))
+
+
+def get_client(provider, api_key):
+    """
+    Process-wide SDK client for `provider`, created on first use.
+
+    Each client owns a pooled HTTP connection (reused across requests) with
+    explicit connect/read timeouts; SDK-level retries are disabled in favour
+    of _with_retries. GROQ_BASE_URL / OPENAI_BASE_URL redirect the clients,
+    e.g. to a local stub server.
+    """
+    key = (provider, api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = _create_client(provider, api_key)
+        return client
+
+
+def _create_client(provider, api_key):
+    if provider == 'groq':
+        import groq as sdk
+        client_class = sdk.Groq
+    else:
+        import openai as sdk
+        client_class = sdk.OpenAI
+
+    timeout = sdk.Timeout(READ_TIMEOUT_S, connect=CONNECT_TIMEOUT_S)
+    # The SDKs may ship different httpx builds; use the limits type they expect
+    limits = type(sdk.DEFAULT_CONNECTION_LIMITS)(max_connections=POOL_CONNECTIONS,
+                                                 max_keepalive_connections=POOL_CONNECTIONS)
+    return client_class(
+        api_key=api_key,
+        timeout=timeout,
+        max_retries=0,
+        http_client=sdk.DefaultHttpxClient(timeout=timeout, limits=limits),
+    )
+
+
+def close_clients():
+    """Close every pooled client (their connections are reopened on next use)."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def _create_completion(provider, api_key, prediction, confidence_score, stream=False):
+    client = get_client(provider, api_key)
+    return _with_retries(lambda: client.chat.completions.create(
+        messages=_build_messages(prediction, confidence_score),
+        temperature=0.7,
+        stream=stream,
+        **_COMPLETION_OPTIONS[provider],
+    ))
+
+
+def _stream_analysis(provider, prediction, confidence_score, api_key):
+    """Stream analysis tokens (only opening the stream is retried)."""
+    stream = _create_completion(provider, api_key, prediction, confidence_score, stream=True)
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def _get_groq_analysis(prediction, confidence_score, api_key):
+    """Get analysis using Groq API (Fast & Free)."""
+    chat_completion = _create_completion('groq', api_key, prediction, confidence_score)
+    return chat_completion.choices[0].message.content
 
 
 def _get_openai_analysis(prediction, confidence_score, api_key):
     """Get analysis using OpenAI API (Alternative option)."""
-    try:
-        import openai
-        
-        openai.api_key = api_key
-        
-        # Create prompt for analysis
-        prompt = f"""You are a medical AI assistant analyzing spinal MRI scan results. 
-        
-Result: {prediction.replace('_', ' ').title()}
-Confidence: {confidence_score:.1%}
+    response = _create_completion('openai', api_key, prediction, confidence_score)
+    return response.choices[0].message.content
 
-Provide a brief, professional analysis (2-3 sentences) covering:
-1. What this result suggests
-2. Recommended next steps
-3. Important considerations
 
-Keep it concise, educational, and appropriate for students learning about AI in healthcare."""
+def _stream_groq_analysis(prediction, confidence_score, api_key):
+    """Stream analysis tokens from the Groq API."""
+    return _stream_analysis('groq', prediction, confidence_score, api_key)
+
+
+def _stream_openai_analysis(prediction, confidence_score, api_key):
+    """Stream analysis tokens from the OpenAI API."""
+    return _stream_analysis('openai', prediction, confidence_score, api_key)
 
-        # Call OpenAI API
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful medical AI assistant providing educational analysis of diagnostic results."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.7,
-            max_tokens=200,
-        )
-        
-        return response.choices[0].message.content
-        
-    except Exception as e:
-        return f"⚠️ Error getting AI analysis: {str(e)}"
+
+_COMPLETION_OPTIONS = {
+    'groq': {'model': GROQ_MODEL, 'max_completion_tokens': 200},  # Fast and accurate
+    'openai': {'model': OPENAI_MODEL, 'max_tokens': 200},
+}
+_PROVIDERS = {'groq': _get_groq_analysis, 'openai': _get_openai_analysis}
+_STREAMING_PROVIDERS = {'groq': _stream_groq_analysis, 'openai': _stream_openai_analysis}
 
 
 def is_api_configured():
     """Check if AI API is configured."""
+    _load_env()
     groq_key = os.getenv('GROQ_API_KEY')
     openai_key = os.getenv('OPENAI_API_KEY')
     
@@ -153,3 +574,60 @@ To enable AI-powered post-prediction analysis:
 **File location:** `Spinal-Disease-Classifier/.env`
 """
 
+
+def main():
+    parser = argparse.ArgumentParser(description="AI analysis utilities")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    prewarm = subparsers.add_parser(
+        'prewarm', help="Fill the interpretation cache for every class and confidence bucket",
+        description="Fill the interpretation cache for every class and confidence bucket. "
+                    "Two classes give 1,002 requests: about 34 min at Groq's free-tier "
+                    "30 requests/min. At higher limits (OpenAI, or a larger --rps) "
+                    "--concurrency and provider latency bound it, typically a few minutes.")
+    prewarm.add_argument('--labels', default='model/labels.txt')
+
+    bulk = subparsers.add_parser('bulk', help="Interpret every row of a score_images output")
+    bulk.add_argument('scores', help="JSONL or CSV written by score_images.py")
+    bulk.add_argument('--output', '-o', required=True, help="JSONL file for the analyses")
+
+    for command in (prewarm, bulk):
+        command.add_argument('--concurrency', type=int, default=BULK_CONCURRENCY,
+                             help="Maximum provider requests in flight")
+        command.add_argument('--rps', type=float, default=None,
+                             help="Provider requests per second (default: SPINE_ANALYSIS_RPS, "
+                                  "else the provider's documented limit: Groq 0.5, OpenAI 58)")
+    args = parser.parse_args()
+
+    if args.command == 'prewarm':
+        from utils import load_labels
+
+        class_names = load_labels(args.labels)
+        requests = len(prewarm_buckets(class_names, 1 / len(class_names)))
+        rate = args.rps or default_rate_limit()
+        print(f"🔥 Pre-warming AI analysis cache for {len(class_names)} classes "
+              f"(up to {requests} requests, ~{requests / rate / 60:.0f} min at {rate:g} req/s)...")
+        summary = prewarm_analysis_cache(class_names, min_confidence=1 / len(class_names),
+                                         concurrency=args.concurrency,
+                                         requests_per_second=args.rps)
+        print(f"✅ Fetched {summary['fetched']}, already cached {summary['cached']}, "
+              f"failed {summary['failed']}")
+        return
+
+    rows = _read_scores(args.scores)
+    print(f"🤖 Interpreting {len(rows)} predictions from {args.scores}...")
+    start = time.perf_counter()
+    analyses = get_ai_analysis_bulk([(row['label'], float(row['confidence'])) for row in rows],
+                                    concurrency=args.concurrency,
+                                    requests_per_second=args.rps)
+    with open(args.output, 'w') as f:
+        for row, analysis in zip(rows, analyses):
+            f.write(json.dumps({'path': row['path'], 'label': row['label'],
+                                'confidence': float(row['confidence']),
+                                'analysis': analysis}) + '\n')
+    print(f"✅ Wrote {len(analyses)} analyses to {args.output} "
+          f"in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
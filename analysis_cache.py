@@ -0,0 +1,96 @@
+"""
+Persistent cache for LLM interpretations of predictions
+Interpretations depend only on the provider, model, predicted class and the
+confidence bucket (the one-decimal percentage shown in the prompt), so a few
+hundred entries cover every possible prompt
+"""
+
+import time
+
+from sqlite_cache import SQLiteCache
+
+CACHE_PATH = 'model/analysis_cache.sqlite3'
+
+# Seconds an interpretation stays valid (one week)
+TTL_SECONDS = 7 * 24 * 3600
+
+# Entries kept in the in-process LRU front
+MEMORY_SIZE = 2048
+
+
+def confidence_bucket(confidence_score):
+    """Confidence in tenths of a percent (0-1000), the resolution used in the prompt."""
+    return int(round(float(confidence_score) * 1000))
+
+
+class AnalysisCache(SQLiteCache):
+    """
+    SQLite-backed interpretation store with a TTL and an in-memory LRU front.
+
+    Keys are (provider, model, class_name, bucket) tuples.
+
+    Args:
+        path: SQLite database path
+        ttl: Seconds before an entry expires
+        memory_size: Entries kept in the in-process LRU
+    """
+
+    table = 'analyses'
+
+    def __init__(self, path=CACHE_PATH, ttl=TTL_SECONDS, memory_size=MEMORY_SIZE):
+        super().__init__(path, memory_size, schema=(
+            """CREATE TABLE IF NOT EXISTS analyses (
+                   provider TEXT NOT NULL,
+                   model TEXT NOT NULL,
+                   class_name TEXT NOT NULL,
+                   bucket INTEGER NOT NULL,
+                   analysis TEXT NOT NULL,
+                   created REAL NOT NULL,
+                   PRIMARY KEY (provider, model, class_name, bucket))""",
+        ))
+        self.ttl = ttl
+        with self._db:
+            self._db.execute("DELETE FROM analyses WHERE created < ?",
+                             (time.time() - self.ttl,))
+
+    def get(self, key):
+        """Return the cached interpretation for `key`, or None if missing/expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self._count_hit(memory=True)
+                return entry[0]
+
+            row = self._db.execute(
+                "SELECT analysis, created FROM analyses "
+                "WHERE provider = ? AND model = ? AND class_name = ? AND bucket = ?",
+                key,
+            ).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                self._memory.pop(key, None)
+                self._count_miss()
+                return None
+
+            self._count_hit()
+            self._remember(key, row)
+            return row[0]
+
+    def put(self, key, analysis):
+        """Store an interpretation (replacing and re-dating any existing entry)."""
+        entry = (analysis, time.time())
+        with self._lock:
+            self._remember(key, entry)
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?, ?)",
+                                 tuple(key) + entry)
+
+    def __contains__(self, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT created FROM analyses "
+                "WHERE provider = ? AND model = ? AND class_name = ? AND bucket = ?",
+                key,
+            ).fetchone()
+        return row is not None and time.time() - row[0] < self.ttl
@@ -0,0 +1,230 @@
+"""
+Pluggable inference backends for the Spinal Disease Classifier
+Every backend exposes the same `predict(batch)` interface used by utils.classify
+
+TensorFlow is only imported by the backend that needs it, so a serving
+process running the TFLite backend on top of `ai_edge_litert` or
+`tflite_runtime` never loads TensorFlow/Keras.
+"""
+
+import os
+
+import numpy as np
+
+# Default artifact locations, written by `python train_model.py export`
+MODEL_DIR = 'model'
+KERAS_PATH = os.path.join(MODEL_DIR, 'spinal_classifier.keras')
+SAVEDMODEL_PATH = os.path.join(MODEL_DIR, 'spinal_classifier_savedmodel')
+TFLITE_PATH = os.path.join(MODEL_DIR, 'spinal_classifier.tflite')
+
+# Maximum absolute probability difference tolerated by the parity check
+PARITY_TOLERANCE = 1e-3
+
+BACKENDS = {}
+
+
+def register_backend(name, default_path):
+    """Class decorator registering an inference backend under `name`."""
+    def decorator(cls):
+        cls.name = name
+        cls.default_path = default_path
+        BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+def load_backend(name, path=None, **options):
+    """
+    Instantiate a registered backend.
+
+    Args:
+        name: Backend name ('keras', 'savedmodel' or 'tflite')
+        path: Model artifact path (defaults to the backend's standard location)
+        **options: Backend-specific options (e.g. num_threads for tflite)
+
+    Returns:
+        Backend instance exposing `predict(batch)`
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'. Available: {', '.join(sorted(BACKENDS))}")
+    cls = BACKENDS[name]
+    return cls(path or cls.default_path, **options)
+
+
+@register_backend('keras', KERAS_PATH)
+class KerasBackend:
+    """
+    Keras checkpoint served through inference.InferenceEngine.
+
+    Args:
+        path: Path to the .keras checkpoint
+        jit_compile: Compile the forward pass with XLA
+        warmup: Trace the forward pass now (False defers it to `warmup()`)
+    """
+
+    def __init__(self, path, jit_compile=False, warmup=True):
+        from keras.models import load_model
+        from inference import InferenceEngine
+
+        self.path = path
+        self.engine = InferenceEngine(load_model(path), jit_compile=jit_compile, warmup=warmup)
+        self.input_dtype = self.engine.input_dtype
+        self.input_channels = self.engine.input_channels
+
+    def predict(self, batch):
+        return self.engine.predict(batch)
+
+    def warmup(self):
+        """Trace the forward pass and record its cold-start latency."""
+        self.engine.warmup()
+
+    def latency_report(self):
+        return self.engine.latency_report()
+
+
+@register_backend('savedmodel', SAVEDMODEL_PATH)
+class SavedModelBackend:
+    """TensorFlow SavedModel exported with `keras.Model.export`."""
+
+    def __init__(self, path):
+        import tensorflow as tf
+
+        self.path = path
+        self._tf = tf
+        self._loaded = tf.saved_model.load(path)
+        self._serve = self._loaded.serve
+        signature = self._loaded.signatures['serving_default']
+        input_spec = next(iter(signature.structured_input_signature[1].values()))
+        self.input_dtype = np.dtype(input_spec.dtype.as_numpy_dtype)
+        self.input_channels = int(input_spec.shape[-1])
+
+    def predict(self, batch):
+        return np.asarray(self._serve(self._tf.convert_to_tensor(batch)))
+
+
+def _tflite_interpreter_class():
+    """Return the lightest available TFLite Interpreter implementation."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+@register_backend('tflite', TFLITE_PATH)
+class TFLiteBackend:
+    """
+    TFLite flatbuffer run through the TFLite interpreter.
+
+    Float inputs are quantized (and integer outputs dequantized) automatically
+    for full-integer models, so quantized variants are drop-in replacements.
+
+    Args:
+        path: Path to the .tflite file
+        num_threads: Interpreter thread count (None lets the runtime decide)
+    """
+
+    def __init__(self, path, num_threads=None):
+        interpreter_class = _tflite_interpreter_class()
+
+        self.path = path
+        self.num_threads = num_threads
+        self._interpreter = interpreter_class(model_path=path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+
+        # Quantized inputs are fed float pixels and quantized in _quantize
+        scale, _ = self._input['quantization']
+        self.input_dtype = np.dtype(np.float32 if scale else self._input['dtype'])
+        self.input_channels = int(self._input['shape'][-1])
+
+    def _resize(self, batch_size):
+        """Resize the input tensor when the batch size changes."""
+        if batch_size == self._batch_size:
+            return
+        shape = [batch_size] + list(self._input['shape'][1:])
+        self._interpreter.resize_tensor_input(self._input['index'], shape)
+        self._interpreter.allocate_tensors()
+        self._batch_size = batch_size
+
+    def _quantize(self, batch):
+        """Map a float batch onto an integer input tensor's quantized domain."""
+        dtype = self._input['dtype']
+        scale, zero_point = self._input['quantization']
+        if not np.issubdtype(dtype, np.integer) or scale == 0:
+            return np.asarray(batch, dtype=dtype)
+        info = np.iinfo(dtype)
+        quantized = np.round(np.asarray(batch) / scale + zero_point)
+        return np.clip(quantized, info.min, info.max).astype(dtype)
+
+    def _dequantize(self, output):
+        """Map an integer output tensor back to float probabilities."""
+        scale, zero_point = self._output['quantization']
+        if not np.issubdtype(output.dtype, np.integer) or scale == 0:
+            return output
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch):
+        batch = self._quantize(batch)
+        self._resize(len(batch))
+        self._interpreter.set_tensor(self._input['index'], batch)
+        self._interpreter.invoke()
+        return self._dequantize(self._interpreter.get_tensor(self._output['index']).copy())
+
+
+def check_parity(data_dir='data/validation', names=None, tolerance=PARITY_TOLERANCE,
+                 batch_size=32, pixels=None):
+    """
+    Check that inference backends agree on every image in `data_dir`.
+
+    The first backend is the reference; every other backend must match its
+    probabilities within `tolerance` (maximum absolute difference).
+
+    Args:
+        data_dir: Directory searched recursively for images
+        names: Backend names to compare (defaults to every registered backend)
+        tolerance: Maximum allowed absolute probability difference
+        batch_size: Images per forward pass
+        pixels: Already decoded uint8 images (e.g. a dataset shard) to use
+            instead of decoding `data_dir`
+
+    Returns:
+        Dict mapping backend name to {'max_abs_diff', 'label_agreement', 'ok'}
+    """
+    from utils import list_images, predict_batch, predict_pixel_batches
+
+    names = list(names or BACKENDS)
+    if pixels is not None:
+        def predict(model):
+            return predict_pixel_batches(pixels, model, batch_size=batch_size)
+    else:
+        paths = list_images(data_dir)
+        if not paths:
+            raise FileNotFoundError(f"No images found in {data_dir}")
+
+        def predict(model):
+            return predict_batch(paths, model, batch_size=batch_size)
+
+    probabilities = {name: predict(load_backend(name)) for name in names}
+
+    reference = probabilities[names[0]]
+    reference_labels = np.argmax(reference, axis=1)
+    report = {}
+    for name in names:
+        diff = float(np.max(np.abs(probabilities[name] - reference)))
+        agreement = float(np.mean(np.argmax(probabilities[name], axis=1) == reference_labels))
+        report[name] = {
+            'max_abs_diff': diff,
+            'label_agreement': agreement,
+            'ok': diff <= tolerance,
+        }
+    return report
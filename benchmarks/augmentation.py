@@ -0,0 +1,123 @@
+"""
+Compare augmentation throughput: per-image ImageDataGenerator, Keras
+preprocessing layers and the batched random_affine op used by tf.data training
+
+All three augment the same decoded uint8 224×224 images with the training
+ranges (rotation, shift, zoom, horizontal flip, nearest fill) and report
+images/second on the current device. The Keras layers resample the batch
+once per layer in float32; random_affine composes every transform into one
+uint8 resampling pass.
+
+Usage:
+    python -m benchmarks.augmentation
+    python -m benchmarks.augmentation --images 512 --batch-size 32
+"""
+
+import argparse
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras import layers
+from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+from train_model import (IMG_SIZE, ROTATION_DEGREES, SHIFT_RANGE, TRAIN_DIR, ZOOM_RANGE,
+                         random_affine)
+from utils import IMG_CHANNELS, list_images, load_image_array
+
+
+def load_pixels(data_dir=TRAIN_DIR, count=256):
+    """Decoded uint8 images from data_dir, repeated until `count` are available."""
+    paths = list_images(data_dir)
+    if not paths:
+        raise FileNotFoundError(f"No images found in {data_dir}")
+    decoded = [load_image_array(p, channels=IMG_CHANNELS) for p in paths[:count]]
+    return np.stack([decoded[i % len(decoded)] for i in range(count)])
+
+
+def generator_rate(pixels, batch_size, seed):
+    """Images/second through ImageDataGenerator.flow (one SciPy transform per image)."""
+    datagen = ImageDataGenerator(rotation_range=ROTATION_DEGREES,
+                                 width_shift_range=SHIFT_RANGE,
+                                 height_shift_range=SHIFT_RANGE,
+                                 horizontal_flip=True, zoom_range=ZOOM_RANGE,
+                                 fill_mode='nearest', dtype='uint8')
+    flow = datagen.flow(pixels, batch_size=batch_size, shuffle=False, seed=seed)
+    start = time.perf_counter()
+    for _ in range(len(flow)):
+        next(flow)
+    return len(pixels) / (time.perf_counter() - start)
+
+
+def keras_layers(seed):
+    """The same augmentation as a stack of Keras preprocessing layers."""
+    return keras.Sequential([
+        keras.Input(shape=IMG_SIZE + (IMG_CHANNELS,), dtype='uint8'),
+        layers.RandomRotation(ROTATION_DEGREES / 360, fill_mode='nearest', seed=seed),
+        layers.RandomTranslation(SHIFT_RANGE, SHIFT_RANGE, fill_mode='nearest', seed=seed),
+        layers.RandomZoom((-ZOOM_RANGE, ZOOM_RANGE), (-ZOOM_RANGE, ZOOM_RANGE),
+                          fill_mode='nearest', seed=seed),
+        layers.RandomFlip('horizontal', seed=seed),
+    ])
+
+
+def graph_rate(augment, pixels, batch_size):
+    """Images/second through a batched tf.function `augment(batch, index)` (after tracing)."""
+    augment = tf.function(augment)
+    batches = [tf.constant(pixels[i:i + batch_size])
+               for i in range(0, len(pixels), batch_size)]
+    augment(batches[0], tf.constant(0, tf.int64))
+
+    start = time.perf_counter()
+    for index, batch in enumerate(batches):
+        augment(batch, tf.constant(index, tf.int64)).numpy()
+    return len(pixels) / (time.perf_counter() - start)
+
+
+def layers_rate(pixels, batch_size, seed):
+    augmentation = keras_layers(seed)
+    return graph_rate(
+        lambda batch, index: tf.cast(augmentation(batch, training=True), tf.uint8),
+        pixels, batch_size)
+
+
+def affine_rate(pixels, batch_size, seed):
+    return graph_rate(
+        lambda batch, index: random_affine(batch, tf.stack([tf.constant(seed, tf.int64), index])),
+        pixels, batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=256)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=TRAIN_DIR)
+    args = parser.parse_args()
+
+    pixels = load_pixels(args.data_dir, args.images)
+    device = 'GPU' if tf.config.list_physical_devices('GPU') else 'CPU'
+
+    print(f"\n⏱️  Augmentation throughput ({len(pixels)} images, batch {args.batch_size}, "
+          f"{device})")
+    print("=" * 50)
+    results = {
+        'ImageDataGenerator': max(generator_rate(pixels, args.batch_size, args.seed)
+                                  for _ in range(args.repeats)),
+        'Keras layers': max(layers_rate(pixels, args.batch_size, args.seed)
+                            for _ in range(args.repeats)),
+        'random_affine': max(affine_rate(pixels, args.batch_size, args.seed)
+                             for _ in range(args.repeats)),
+    }
+
+    baseline = results['ImageDataGenerator']
+    print(f"{'augmentation':<20} {'images/s':>12} {'speedup':>10}")
+    for name, ips in results.items():
+        print(f"{name:<20} {ips:>12.1f} {ips / baseline:>9.2f}x")
+    print("=" * 50)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark classify_batch throughput (images/second) at several batch sizes
+
+Usage:
+    python -m benchmarks.batch_throughput
+    python -m benchmarks.batch_throughput --images 512 --batch-sizes 1 8 32 64
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from utils import IMG_CHANNELS, classify_batch, list_images, load_labels
+
+MODEL_PATH = 'model/spinal_classifier.keras'
+LABELS_PATH = 'model/labels.txt'
+DATA_DIR = 'data/validation'
+
+
+def load_model_and_labels(model_path=MODEL_PATH, labels_path=LABELS_PATH):
+    """
+    Load the trained classifier, or an untrained one with the same
+    architecture when no checkpoint exists (timings are identical).
+    """
+    labels = load_labels(labels_path)
+
+    if Path(model_path).exists():
+        from keras.models import load_model
+        return load_model(model_path), labels
+
+    print(f"⚠️  {model_path} not found, using randomly initialized weights")
+    from train_model import build_model
+    return build_model(len(labels), weights=None), labels
+
+
+def load_images(data_dir=DATA_DIR, count=256):
+    """Decode images from data_dir, repeating them until `count` are available."""
+    paths = list_images(data_dir)
+    if not paths:
+        raise FileNotFoundError(f"No images found in {data_dir}")
+
+    mode = 'L' if IMG_CHANNELS == 1 else 'RGB'
+    decoded = [Image.open(p).convert(mode) for p in paths]
+    return [decoded[i % len(decoded)] for i in range(count)]
+
+
+def run(model, class_names, images, batch_sizes, repeats=3):
+    """Return {batch_size: best images/second over `repeats` runs}."""
+    results = {}
+    for batch_size in batch_sizes:
+        # Warm-up so graph tracing is not counted
+        classify_batch(images[:batch_size], model, class_names, batch_size=batch_size)
+
+        best = 0.0
+        for _ in range(repeats):
+            start = time.perf_counter()
+            classify_batch(images, model, class_names, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+            best = max(best, len(images) / elapsed)
+        results[batch_size] = best
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=256,
+                        help='Number of images scored per run')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 64])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    args = parser.parse_args()
+
+    model, class_names = load_model_and_labels()
+    images = load_images(args.data_dir, args.images)
+
+    print(f"\n⏱️  classify_batch throughput ({len(images)} images)")
+    print("=" * 50)
+    results = run(model, class_names, images, args.batch_sizes, args.repeats)
+
+    baseline = results[args.batch_sizes[0]]
+    print(f"{'batch':>8} {'images/s':>12} {'speedup':>10}")
+    for batch_size, ips in results.items():
+        print(f"{batch_size:>8} {ips:>12.1f} {ips / baseline:>9.2f}x")
+    print("=" * 50)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Fake chat-completions provider for exercising ai_analysis without an API key
+
+Mimics the Groq/OpenAI chat-completions endpoint (plain and streamed) with
+injectable latency and failures, so clients, retries and provider routing
+can be checked locally.
+
+Usage:
+    python -m benchmarks.fake_llm_server --port 8901 --delay-ms 200 --fail-rate 0.2
+    GROQ_API_KEY=test GROQ_BASE_URL=http://127.0.0.1:8901 streamlit run main.py
+    OPENAI_API_KEY=test OPENAI_BASE_URL=http://127.0.0.1:8901/v1 streamlit run main.py
+
+Endpoints:
+    POST */chat/completions   -> chat.completion (or SSE chunks when "stream": true)
+    GET  /stats               -> {"requests": ..., "failures": ...}
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import tornado.web
+
+REPLY = ("This result is consistent with the predicted class at the reported "
+         "confidence. Correlate with symptoms and clinical examination before "
+         "drawing conclusions. This is an educational demonstration only.")
+
+
+class CompletionsHandler(tornado.web.RequestHandler):
+    def initialize(self, config, stats):
+        self.config = config
+        self.stats = stats
+
+    async def post(self):
+        self.stats['requests'] += 1
+        request = json.loads(self.request.body or b'{}')
+
+        failing = (self.stats['requests'] <= self.config['fail_first']
+                   or random.random() < self.config['fail_rate'])
+        if failing:
+            self.stats['failures'] += 1
+            self.set_status(self.config['fail_status'])
+            self.finish({'error': {'message': 'Injected failure', 'type': 'server_error'}})
+            return
+
+        await asyncio.sleep(self.config['delay_ms'] / 1000.0)
+
+        model = request.get('model', 'fake-model')
+        if not request.get('stream'):
+            self.finish({
+                'id': f"chatcmpl-{self.stats['requests']}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': REPLY}}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+            })
+            return
+
+        self.set_header('Content-Type', 'text/event-stream')
+        for word in REPLY.split(' '):
+            chunk = {
+                'id': f"chatcmpl-{self.stats['requests']}",
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'finish_reason': None,
+                             'delta': {'content': word + ' '}}],
+            }
+            self.write(f"data: {json.dumps(chunk)}\n\n")
+            await self.flush()
+            await asyncio.sleep(self.config['token_delay_ms'] / 1000.0)
+        self.write("data: [DONE]\n\n")
+
+
+class StatsHandler(tornado.web.RequestHandler):
+    def initialize(self, config, stats):
+        self.stats = stats
+
+    def get(self):
+        self.write(self.stats)
+
+
+def make_app(delay_ms=0.0, token_delay_ms=10.0, fail_rate=0.0, fail_status=503, fail_first=0):
+    """Build the fake provider application."""
+    options = {
+        'config': {'delay_ms': delay_ms, 'token_delay_ms': token_delay_ms,
+                   'fail_rate': fail_rate, 'fail_status': fail_status,
+                   'fail_first': fail_first},
+        'stats': {'requests': 0, 'failures': 0},
+    }
+    return tornado.web.Application([
+        (r'/stats', StatsHandler, options),
+        (r'.*/chat/completions', CompletionsHandler, options),
+    ])
+
+
+async def serve(args):
+    make_app(args.delay_ms, args.token_delay_ms, args.fail_rate,
+             args.fail_status, args.fail_first).listen(args.port, address=args.host)
+    print(f"🤖 Fake LLM provider on http://{args.host}:{args.port} "
+          f"(delay {args.delay_ms} ms, fail rate {args.fail_rate:.0%})")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--delay-ms', type=float, default=0.0,
+                        help="Delay before the response (or first token)")
+    parser.add_argument('--token-delay-ms', type=float, default=10.0,
+                        help="Delay between streamed tokens")
+    parser.add_argument('--fail-rate', type=float, default=0.0,
+                        help="Fraction of requests answered with --fail-status")
+    parser.add_argument('--fail-status', type=int, default=503)
+    parser.add_argument('--fail-first', type=int, default=0,
+                        help="Answer the first N requests with --fail-status")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+Reproducible end-to-end inference benchmark with a regression gate
+
+Times every stage of the inference path separately (PNG decode and resize
+to the model's channels, normalization, a forward pass at several batch sizes and the full classify
+call) on data/validation or on seeded synthetic scans, and writes p50/p95/p99
+latency, throughput and peak RSS to a JSON report. `compare` fails (exit
+status 1) when a report regresses beyond a threshold against a baseline.
+
+Usage:
+    python -m benchmarks.inference_suite run --output bench.json
+    python -m benchmarks.inference_suite run --synthetic --output bench.json
+    python -m benchmarks.inference_suite compare baseline.json bench.json --threshold 0.10
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from backends import BACKENDS, load_backend
+from utils import IMG_CHANNELS, classify, list_images, load_image_array, load_labels, predict_pixels
+
+LABELS_PATH = 'model/labels.txt'
+DATA_DIR = 'data/validation'
+
+# Source resolution of the organized dataset (synthetic scans match it)
+SOURCE_SIZE = (384, 384)
+
+# Default relative slowdown tolerated by `compare`
+REGRESSION_THRESHOLD = 0.10
+
+# Metrics checked by `compare`: name -> True if higher is better
+GATED_METRICS = {
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'throughput_per_s': True,
+}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def load_png_bodies(data_dir=DATA_DIR, count=64):
+    """Raw PNG bytes of the first `count` images under `data_dir` (sorted)."""
+    paths = list_images(data_dir)[:count]
+    if not paths:
+        raise FileNotFoundError(f"No images found in {data_dir}")
+    bodies = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            bodies.append(f.read())
+    return bodies
+
+
+def synthetic_png_bodies(count=64, seed=0):
+    """Seeded random grayscale scans at the dataset resolution, encoded as PNGs."""
+    rng = np.random.default_rng(seed)
+    width, height = SOURCE_SIZE
+    bodies = []
+    for _ in range(count):
+        gray = rng.integers(0, 256, size=(height, width), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(gray).save(buffer, format='PNG')
+        bodies.append(buffer.getvalue())
+    return bodies
+
+
+def summarize(latencies_ms, items_per_call=1):
+    """Percentiles, mean and throughput for a list of per-call latencies."""
+    latencies = np.asarray(latencies_ms, dtype=np.float64)
+    return {
+        'calls': int(len(latencies)),
+        'items_per_call': items_per_call,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'mean_ms': float(latencies.mean()),
+        'throughput_per_s': items_per_call * 1000.0 / float(latencies.mean()),
+    }
+
+
+def time_stage(fn, inputs, iterations, warmup=3, items_per_call=1):
+    """Call `fn` on inputs round-robin; warm-up calls are not timed."""
+    for i in range(warmup):
+        fn(inputs[i % len(inputs)])
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(inputs[i % len(inputs)])
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    return summarize(latencies, items_per_call)
+
+
+def run(model, class_names, bodies, batch_sizes, iterations):
+    """
+    Benchmark each stage of the inference path.
+
+    Args:
+        model: Trained Keras model or inference backend
+        class_names: List of class names
+        bodies: Raw PNG bytes used as input
+        batch_sizes: Batch sizes for the forward-pass stage
+        iterations: Timed calls per stage
+
+    Returns:
+        Dict of stage name -> summary (see summarize), plus the peak RSS
+        observed after the stage as 'peak_rss_mb'
+    """
+    stages = {}
+
+    def record(name, summary):
+        summary['peak_rss_mb'] = peak_rss_mb()
+        stages[name] = summary
+
+    def decode(body):
+        return load_image_array(io.BytesIO(body), channels=IMG_CHANNELS)
+
+    record('decode_resize', time_stage(decode, bodies, iterations))
+
+    decoded = [decode(body) for body in bodies]
+    record('normalize', time_stage(
+        lambda image: image.astype(np.float32) / 255.0, decoded, iterations))
+
+    pixels = np.stack(decoded)
+    for batch_size in batch_sizes:
+        batches = [np.take(pixels, range(start, start + batch_size), axis=0, mode='wrap')
+                   for start in range(0, len(pixels), batch_size)]
+        record(f'predict_batch_{batch_size}', time_stage(
+            lambda batch: predict_pixels(batch, model), batches, iterations,
+            items_per_call=batch_size))
+
+    record('classify', time_stage(
+        lambda body: classify(io.BytesIO(body), model, class_names), bodies, iterations))
+    return stages
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    List metric regressions of `current` against `baseline`.
+
+    Latencies may grow and throughput may shrink by at most `threshold`
+    (a fraction); stages missing from either report are ignored.
+
+    Returns:
+        List of (stage, metric, baseline value, current value, relative change)
+    """
+    regressions = []
+    for stage, before in baseline['stages'].items():
+        after = current['stages'].get(stage)
+        if after is None:
+            continue
+        for metric, higher_is_better in GATED_METRICS.items():
+            old, new = before[metric], after[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append((stage, metric, old, new, change))
+    return regressions
+
+
+def _metadata(args, model, images):
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'backend': args.backend,
+        'model_path': getattr(model, 'path', args.model_path),
+        'input': 'synthetic' if args.synthetic else args.data_dir,
+        'images': images,
+        'iterations': args.iterations,
+        'seed': args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Benchmark the inference path")
+    run_parser.add_argument('--output', '-o', default='benchmark_report.json')
+    run_parser.add_argument('--backend', choices=sorted(BACKENDS), default='keras')
+    run_parser.add_argument('--model-path', default=None)
+    run_parser.add_argument('--labels', default=LABELS_PATH)
+    run_parser.add_argument('--data-dir', default=DATA_DIR)
+    run_parser.add_argument('--synthetic', action='store_true',
+                            help="Use seeded random scans instead of --data-dir")
+    run_parser.add_argument('--images', type=int, default=64)
+    run_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    run_parser.add_argument('--iterations', type=int, default=50,
+                            help="Timed calls per stage")
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--baseline', default=None,
+                            help="Compare against this report after the run")
+    run_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+
+    compare_parser = subparsers.add_parser('compare', help="Gate a report against a baseline")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        bodies = (synthetic_png_bodies(args.images, args.seed) if args.synthetic
+                  else load_png_bodies(args.data_dir, args.images))
+        class_names = load_labels(args.labels)
+        model = load_backend(args.backend, args.model_path)
+
+        print(f"\n⏱️  Inference benchmark ({args.backend}, {len(bodies)} images, "
+              f"{args.iterations} calls per stage)")
+        print("=" * 70)
+        stages = run(model, class_names, bodies, args.batch_sizes, args.iterations)
+        print(f"{'stage':<18} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+              f"{'items/s':>10} {'RSS MiB':>9}")
+        for name, summary in stages.items():
+            print(f"{name:<18} {summary['p50_ms']:>9.2f} {summary['p95_ms']:>9.2f} "
+                  f"{summary['p99_ms']:>9.2f} {summary['throughput_per_s']:>10.1f} "
+                  f"{summary['peak_rss_mb']:>9.0f}")
+        print("=" * 70)
+
+        report = {
+            'metadata': _metadata(args, model, len(bodies)),
+            'stages': stages,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report saved to {args.output}")
+
+        if not args.baseline:
+            return
+        baseline_path, current = args.baseline, report
+    else:
+        baseline_path = args.baseline
+        with open(args.current, 'r') as f:
+            current = json.load(f)
+
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+
+    regressions = compare(baseline, current, args.threshold)
+    if not regressions:
+        print(f"✅ No regressions beyond {args.threshold:.0%} against {baseline_path}")
+        return
+    print(f"❌ {len(regressions)} regression(s) beyond {args.threshold:.0%} "
+          f"against {baseline_path}:")
+    for stage, metric, old, new, change in regressions:
+        print(f"   {stage:<18} {metric:<17} {old:>10.2f} -> {new:>10.2f} ({change:+.1%})")
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Compare training input pipelines: ImageDataGenerator versus tf.data over the
+PNGs and over the memory-mapped dataset shards
+
+Iterates each pipeline for a few epochs and reports batches (steps) per
+second per epoch. The first tf.data (PNG) epoch decodes and fills the cache;
+later epochs read cached uint8 tensors. The shard pipeline never decodes.
+With --model, every batch also runs a training step of the (randomly
+initialized) classifier, so the numbers show whether the input pipeline or
+the model sets the pace.
+
+Usage:
+    python -m benchmarks.input_pipeline
+    python -m benchmarks.input_pipeline --epochs 3 --model
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import train_model
+from train_model import build_model, create_data_generators, create_datasets
+
+
+def epoch_rates(batches, steps, epochs, model=None):
+    """Steps/second for each of `epochs` passes of `steps` batches."""
+    rates = []
+    for _ in range(epochs):
+        start = time.perf_counter()
+        for _, (images, labels) in zip(range(steps), batches()):
+            if model is not None:
+                model.train_on_batch(images, labels)
+        rates.append(steps / (time.perf_counter() - start))
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=train_model.BATCH_SIZE)
+    parser.add_argument('--cache', default='',
+                        help="tf.data on-disk cache prefix (default: in memory)")
+    parser.add_argument('--model', action='store_true',
+                        help="Also run a training step on every batch")
+    args = parser.parse_args()
+
+    train_model.BATCH_SIZE = args.batch_size
+    train_generator, _ = create_data_generators()
+    steps = len(train_generator)
+    class_names = list(train_generator.class_indices)
+
+    train_dataset, _, dataset_classes, _ = create_datasets(cache=args.cache)
+    shard_dataset, _, shard_classes, _ = create_datasets(shards=True)
+    for classes in (dataset_classes, shard_classes):
+        if classes != class_names:
+            raise SystemExit(f"❌ Class indices differ: {classes} vs {class_names}")
+
+    model = None
+    if args.model:
+        model = build_model(len(class_names), weights=None)
+        # Trace the train step outside the timed epochs
+        images, labels = next(iter(train_dataset))
+        model.train_on_batch(images, labels)
+
+    pipelines = {
+        'ImageDataGenerator': lambda: iter(train_generator),
+        'tf.data': lambda: iter(train_dataset),
+        'tf.data (shards)': lambda: iter(shard_dataset),
+    }
+
+    print(f"\n⏱️  Input pipeline throughput ({steps} steps/epoch, batch {args.batch_size}"
+          f"{', with training step' if model is not None else ''})")
+    print("=" * 60)
+    results = {name: epoch_rates(batches, steps, args.epochs, model)
+               for name, batches in pipelines.items()}
+
+    header = ' '.join(f"{'epoch ' + str(i + 1):>10}" for i in range(args.epochs))
+    print(f"{'pipeline':<20} {header} {'steady':>10}")
+    for name, rates in results.items():
+        steady = np.mean(rates[1:]) if len(rates) > 1 else rates[0]
+        print(f"{name:<20} " + ' '.join(f"{rate:>10.1f}" for rate in rates)
+              + f" {steady:>10.1f}")
+
+    baseline = results['ImageDataGenerator']
+    speedup = np.mean(results['tf.data'][1:] or results['tf.data']) / \
+        np.mean(baseline[1:] or baseline)
+    print("=" * 60)
+    print(f"tf.data steady-state speedup: {speedup:.2f}x (steps/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Load-test a running serve.py instance with concurrent uploads
+
+Usage:
+    python serve.py --port 8000 &
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --concurrency 32
+"""
+
+import argparse
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils import list_images
+
+DATA_DIR = 'data/validation'
+
+
+def post_image(url, body):
+    """POST one raw image body; returns client-side latency in ms."""
+    request = urllib.request.Request(f"{url}/predict", data=body, method='POST',
+                                     headers={'Content-Type': 'application/octet-stream'})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        json.loads(response.read())
+    return (time.perf_counter() - start) * 1000.0
+
+
+def run(url, bodies, requests, concurrency):
+    """Fire `requests` uploads with `concurrency` clients; return a summary dict."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(lambda i: post_image(url, bodies[i % len(bodies)]),
+                                  range(requests)))
+    elapsed = time.perf_counter() - start
+
+    with urllib.request.urlopen(f"{url}/queue") as response:
+        queue = json.loads(response.read())
+
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'throughput_rps': requests / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'server_mean_batch_size': queue['mean_batch_size'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--requests', type=int, default=256)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    args = parser.parse_args()
+
+    bodies = [path.read_bytes() for path in list_images(args.data_dir)]
+    if not bodies:
+        raise FileNotFoundError(f"No images found in {args.data_dir}")
+
+    print(f"\n⏱️  Load test against {args.url} ({args.requests} requests per level)")
+    print("=" * 72)
+    print(f"{'clients':>8} {'req/s':>9} {'p50 (ms)':>10} {'p95 (ms)':>10} "
+          f"{'p99 (ms)':>10} {'mean batch':>11}")
+    for concurrency in args.concurrency:
+        result = run(args.url, bodies, args.requests, concurrency)
+        print(f"{concurrency:>8} {result['throughput_rps']:>9.1f} {result['p50_ms']:>10.1f} "
+              f"{result['p95_ms']:>10.1f} {result['p99_ms']:>10.1f} "
+              f"{result['server_mean_batch_size']:>11.2f}")
+    print("=" * 72)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Find the fastest workers x threads split of the inference worker pool
+
+Every split with workers * intra-op threads <= available cores is timed on
+the same workload; the single-process in-thread backend is the baseline.
+
+Usage:
+    python -m benchmarks.worker_tuning
+    python -m benchmarks.worker_tuning --backend tflite --images 512
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from backends import BACKENDS, load_backend
+from utils import IMG_CHANNELS, load_image_array, list_images, predict_pixels
+from worker_pool import WorkerPool
+
+DATA_DIR = 'data/validation'
+
+
+def load_workload(data_dir, count):
+    """Decode validation images (repeated to `count`) into one uint8 NHWC array."""
+    paths = list_images(data_dir)
+    if not paths:
+        raise FileNotFoundError(f"No images found in {data_dir}")
+    decoded = [load_image_array(path, channels=IMG_CHANNELS) for path in paths]
+    return np.stack([decoded[i % len(decoded)] for i in range(count)])
+
+
+def candidate_splits(cores):
+    """All (workers, intra-op threads) pairs that fit on `cores` cores."""
+    return [(workers, threads)
+            for workers in range(1, cores + 1)
+            for threads in range(1, cores // workers + 1)]
+
+
+def time_model(model, pixels, batch_size, repeats):
+    """Best images/second over `repeats` passes, scoring `batch_size` at a time."""
+    predict_pixels(pixels[:batch_size], model)
+    best = 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for offset in range(0, len(pixels), batch_size):
+            predict_pixels(pixels[offset:offset + batch_size], model)
+        best = max(best, len(pixels) / (time.perf_counter() - start))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='keras')
+    parser.add_argument('--model-path', default=None)
+    parser.add_argument('--cores', type=int, default=os.cpu_count())
+    parser.add_argument('--images', type=int, default=256)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--repeats', type=int, default=2)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    args = parser.parse_args()
+
+    pixels = load_workload(args.data_dir, args.images)
+
+    print(f"\n⏱️  Worker pool tuning ({args.backend}, {args.cores} cores, {len(pixels)} images)")
+    print("=" * 50)
+    baseline = time_model(load_backend(args.backend, args.model_path), pixels,
+                          args.batch_size, args.repeats)
+    print(f"{'in-process':<20} {baseline:>10.1f} images/s")
+
+    results = {}
+    for workers, threads in candidate_splits(args.cores):
+        with WorkerPool(args.backend, args.model_path, workers=workers,
+                        intra_op_threads=threads) as pool:
+            results[(workers, threads)] = time_model(pool, pixels, args.batch_size,
+                                                     args.repeats)
+        print(f"{f'{workers} x {threads} threads':<20} "
+              f"{results[(workers, threads)]:>10.1f} images/s")
+
+    (workers, threads), best = max(results.items(), key=lambda item: item[1])
+    print("=" * 50)
+    print(f"✅ Best split: {workers} workers x {threads} intra-op threads "
+          f"({best:.1f} images/s, {best / baseline:.2f}x in-process)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Preprocessed dataset shards for training and evaluation
+Compiles each split (data/train, data/validation) once into a uint8 .npy
+array of decoded, resized (single-channel) images plus a label array and a JSON manifest, so
+training and evaluation memory-map the pixels instead of decoding PNGs again
+
+Usage:
+    python dataset_shards.py build              # (re)build changed splits
+    python dataset_shards.py benchmark          # PNG decode vs. shard load time
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from utils import IMG_CHANNELS, IMG_SIZE, file_hash, list_images, load_image_array
+
+SHARD_DIR = 'data/shards'
+SPLITS = {'train': 'data/train', 'validation': 'data/validation'}
+
+
+def class_names_from_directory(directory):
+    """Class subdirectories in flow_from_directory order (sorted)."""
+    return sorted(d for d in os.listdir(directory)
+                  if os.path.isdir(os.path.join(directory, d)) and not d.startswith('.'))
+
+
+def shard_files(split, shard_dir=SHARD_DIR):
+    """Paths of a split's pixel array, label array and manifest."""
+    base = os.path.join(shard_dir, split)
+    return f"{base}_pixels.npy", f"{base}_labels.npy", f"{base}.json"
+
+
+def _read_manifest(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def build_shard(split, source_dir=None, shard_dir=SHARD_DIR, class_names=None):
+    """
+    Compile (or incrementally update) one split's shard.
+
+    Files whose path, size and mtime match the manifest are not read; files
+    whose contents hash to an existing row (e.g. touched or renamed) reuse it.
+    Only new or changed images are decoded. Nothing is written when the
+    split is unchanged.
+
+    Args:
+        split: Shard name, e.g. 'train'
+        source_dir: Class-per-folder image directory (defaults to SPLITS[split])
+        shard_dir: Output directory
+        class_names: Label order (defaults to the sorted class folders)
+
+    Returns:
+        Dict with the number of images decoded, reused and dropped, and
+        whether the shard was rewritten
+    """
+    source_dir = source_dir or SPLITS[split]
+    class_names = class_names or class_names_from_directory(source_dir)
+    pixels_path, labels_path, manifest_path = shard_files(split, shard_dir)
+
+    old = _read_manifest(manifest_path)
+    if (old is None or not os.path.exists(pixels_path)
+            or old['img_size'] != list(IMG_SIZE) or old.get('channels') != IMG_CHANNELS
+            or old['class_names'] != class_names):
+        old = {'items': []}
+    old_pixels = np.load(pixels_path, mmap_mode='r') if old['items'] else None
+    old_by_path = {item['path']: (row, item) for row, item in enumerate(old['items'])}
+    old_by_hash = {item['hash']: row for row, item in enumerate(old['items'])}
+
+    items, sources = [], []
+    for path in list_images(source_dir):
+        stat = os.stat(path)
+        row, item = old_by_path.get(str(path), (None, None))
+        if item is not None and item['size'] == stat.st_size and item['mtime_ns'] == stat.st_mtime_ns:
+            digest = item['hash']
+        else:
+            digest = file_hash(path)
+            row = old_by_hash.get(digest)
+        items.append({'path': str(path), 'label': class_names.index(path.parent.name),
+                      'hash': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+        sources.append(row)
+
+    decoded = sum(1 for row in sources if row is None)
+    summary = {'images': len(items), 'decoded': decoded, 'reused': len(items) - decoded,
+               'dropped': len(old['items']) - len(set(sources) - {None}), 'rewritten': False}
+    if items == old['items']:
+        return summary
+
+    os.makedirs(shard_dir, exist_ok=True)
+    width, height = IMG_SIZE
+    temp_path = pixels_path + '.tmp.npy'
+    pixels = np.lib.format.open_memmap(temp_path, mode='w+', dtype=np.uint8,
+                                       shape=(len(items), height, width, IMG_CHANNELS))
+    for index, (item, row) in enumerate(zip(items, sources)):
+        pixels[index] = (old_pixels[row] if row is not None
+                         else load_image_array(item['path'], channels=IMG_CHANNELS))
+    pixels.flush()
+    del pixels, old_pixels
+    os.replace(temp_path, pixels_path)
+
+    np.save(labels_path, np.array([item['label'] for item in items], dtype=np.int32))
+    with open(manifest_path, 'w') as f:
+        json.dump({'source_dir': source_dir, 'img_size': list(IMG_SIZE),
+                   'channels': IMG_CHANNELS, 'class_names': class_names, 'items': items}, f, indent=1)
+    summary['rewritten'] = True
+    return summary
+
+
+def load_shard(split, shard_dir=SHARD_DIR, update=True):
+    """
+    Memory-map one split.
+
+    Args:
+        split: Shard name, e.g. 'validation'
+        shard_dir: Shard directory
+        update: Bring the shard up to date with its source directory first
+            (cheap when nothing changed: only file metadata is checked)
+
+    Returns:
+        Tuple of (read-only uint8 pixels memmap (N, height, width, IMG_CHANNELS),
+        int32 labels (N,), manifest dict)
+    """
+    if update:
+        build_shard(split, shard_dir=shard_dir)
+    pixels_path, labels_path, manifest_path = shard_files(split, shard_dir)
+    return (np.load(pixels_path, mmap_mode='r'), np.load(labels_path),
+            _read_manifest(manifest_path))
+
+
+def benchmark(split='validation', shard_dir=SHARD_DIR):
+    """Seconds to load a split's pixels by decoding PNGs versus from its shard."""
+    build_shard(split, shard_dir=shard_dir)
+
+    start = time.perf_counter()
+    decoded = np.stack([load_image_array(path, channels=IMG_CHANNELS)
+                        for path in list_images(SPLITS[split])])
+    decode_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pixels, _, _ = load_shard(split, shard_dir)
+    loaded = np.array(pixels)  # touch every page
+    shard_s = time.perf_counter() - start
+
+    if not np.array_equal(decoded, loaded):
+        raise RuntimeError(f"Shard {split} does not match its source images")
+    return {'images': len(loaded), 'decode_s': decode_s, 'shard_s': shard_s}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocessed dataset shards")
+    parser.add_argument('command', choices=['build', 'benchmark'])
+    parser.add_argument('--splits', nargs='+', choices=sorted(SPLITS), default=list(SPLITS))
+    parser.add_argument('--shard-dir', default=SHARD_DIR)
+    args = parser.parse_args()
+
+    for split in args.splits:
+        if args.command == 'build':
+            start = time.perf_counter()
+            summary = build_shard(split, shard_dir=args.shard_dir)
+            status = "rebuilt" if summary['rewritten'] else "up to date"
+            print(f"✅ {split}: {summary['images']} images {status} "
+                  f"({summary['decoded']} decoded, {summary['reused']} reused, "
+                  f"{summary['dropped']} dropped) in {time.perf_counter() - start:.2f} s")
+        else:
+            result = benchmark(split, args.shard_dir)
+            print(f"⏱️  {split}: {result['images']} images — PNG decode "
+                  f"{result['decode_s']:.3f} s, shard {result['shard_s']:.3f} s "
+                  f"({result['decode_s'] / result['shard_s']:.0f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
@@ -35,12 +35,11 @@ def convert_dicom_to_png(dicom_path, output_path):
         img_array = (img_array - img_array.min()) / (img_array.max() - img_array.min()) * 255.0
         img_array = img_array.astype(np.uint8)
         
-        # Convert to PIL Image and save
+        # Save as a single-channel (L) image; models replicate the channel
+        # to RGB in-graph, so storing three identical channels only costs
+        # disk, decode time and memory
         img = Image.fromarray(img_array)
         
-        # Convert to RGB (needed for training)
-        img = img.convert('RGB')
-        
         img.save(output_path, 'PNG')
         return True
     except Exception as e:
@@ -0,0 +1,75 @@
+"""
+Bottleneck-feature cache for training the classifier head
+Stores the frozen backbone's pooled features for each training image (and for
+augmented copies of it) in a float16 memory-mapped matrix keyed by image
+hash, so the head can be retrained without running the backbone again
+"""
+
+import numpy as np
+
+from float16_matrix import Float16Matrix
+
+FEATURES_PATH = 'model/feature_cache.f16'
+METADATA_PATH = 'model/feature_cache.json'
+
+
+class FeatureCache:
+    """
+    Float16 memory-mapped feature matrix with a JSON metadata sidecar.
+
+    Each row holds the features of one (image hash, copy) pair; copy 0 is the
+    un-augmented image and copies 1..K are augmented views. New rows are
+    appended in place. The cache is discarded when the backbone fingerprint
+    (architecture, weights, preprocessing and augmentation settings) changes.
+
+    Args:
+        fingerprint: Identifies the feature extractor the rows came from
+        features_path: Raw float16 matrix file
+        metadata_path: JSON sidecar holding dim, fingerprint and row keys
+    """
+
+    def __init__(self, fingerprint, features_path=FEATURES_PATH, metadata_path=METADATA_PATH):
+        self.fingerprint = fingerprint
+        self.features_path = features_path
+        self.metadata_path = metadata_path
+        self.dim = None
+        self.rows = {}
+        self._store = Float16Matrix(features_path, metadata_path)
+
+        if self._store.exists():
+            metadata = self._store.read_metadata()
+            if metadata.get('fingerprint') == fingerprint:
+                self.dim = metadata['dim']
+                self.rows = {(key, copy): row for key, copy, row in metadata['rows']}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    @property
+    def matrix(self):
+        """Memory-mapped (rows, dim) float16 feature matrix."""
+        return self._store.view(len(self.rows), self.dim)
+
+    def get(self, keys):
+        """float32 features for a list of (image hash, copy) keys, in order."""
+        return self.matrix[[self.rows[key] for key in keys]].astype(np.float32)
+
+    def add(self, keys, features):
+        """Append rows for new (image hash, copy) keys and save the sidecar."""
+        features = np.asarray(features)
+        append = self.dim is not None
+        if not append:
+            self.dim = int(features.shape[1])
+        elif features.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim features, got {features.shape[1]}")
+
+        self._store.write(features, append=append)
+        for key in keys:
+            self.rows[tuple(key)] = len(self.rows)
+
+        self._store.write_metadata({
+            'dim': self.dim, 'fingerprint': self.fingerprint,
+            'rows': [[key, copy, row] for (key, copy), row in self.rows.items()]})
@@ -0,0 +1,63 @@
+"""
+Append-only float16 matrix file with a JSON metadata sidecar
+Shared storage layout of the similar-case index and the bottleneck-feature
+cache: rows are appended to a raw float16 file in place and read back
+through a memory map, while the sidecar describes them
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+class Float16Matrix:
+    """
+    Raw float16 (rows, dim) matrix file plus its JSON metadata sidecar.
+
+    The file carries no header; the owner keeps `dim` and the row
+    descriptions in the sidecar and passes the row count to `view`.
+
+    Args:
+        matrix_path: Raw float16 matrix file
+        metadata_path: JSON sidecar
+    """
+
+    def __init__(self, matrix_path, metadata_path):
+        self.matrix_path = matrix_path
+        self.metadata_path = metadata_path
+        self._view = None
+
+    def exists(self):
+        return os.path.exists(self.matrix_path) and os.path.exists(self.metadata_path)
+
+    def read_metadata(self):
+        """The sidecar contents."""
+        with open(self.metadata_path, 'r') as f:
+            return json.load(f)
+
+    def write_metadata(self, metadata, indent=None):
+        with open(self.metadata_path, 'w') as f:
+            json.dump(metadata, f, indent=indent)
+
+    def view(self, rows, dim):
+        """Read-only (rows, dim) float16 memory map (reopened when rows change)."""
+        if self._view is None or self._view.shape != (rows, dim):
+            self._view = np.memmap(self.matrix_path, dtype=np.float16, mode='r',
+                                   shape=(rows, dim))
+        return self._view
+
+    def write(self, values, append=False):
+        """
+        Write (or append) rows as float16.
+
+        Returns:
+            The rows as a float16 array
+        """
+        values = np.asarray(values, dtype=np.float16)
+        if not append:
+            os.makedirs(os.path.dirname(self.matrix_path) or '.', exist_ok=True)
+        with open(self.matrix_path, 'ab' if append else 'wb') as f:
+            values.tofile(f)
+        self._view = None
+        return values
@@ -0,0 +1,120 @@
+"""
+Low-overhead inference engine for the Spinal Disease Classifier
+Wraps a Keras model in a traced, fixed-signature tf.function
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+import tensorflow as tf
+
+from utils import IMG_SIZE
+
+# Number of timed calls made after the first (tracing) call during warm-up
+WARMUP_RUNS = 5
+
+# Number of recent call latencies kept for steady-state reporting
+LATENCY_WINDOW = 256
+
+
+def _input_spec(model):
+    """Build a TensorSpec (dynamic batch dimension) from the model's input."""
+    try:
+        tensor = model.inputs[0]
+        shape = (None,) + tuple(tensor.shape[1:])
+        dtype = tf.as_dtype(tensor.dtype)
+    except (AttributeError, IndexError, TypeError, ValueError):
+        width, height = IMG_SIZE
+        shape, dtype = (None, height, width, 3), tf.float32
+    return tf.TensorSpec(shape=shape, dtype=dtype, name='image')
+
+
+def _to_numpy(outputs):
+    """Convert a tensor (or a list/dict of tensors) returned by the model to NumPy."""
+    return tf.nest.map_structure(lambda tensor: tensor.numpy(), outputs)
+
+
+class InferenceEngine:
+    """
+    Serve a Keras model through a single traced tf.function.
+
+    Calling `model.predict` builds a data adapter and runs a predict loop on
+    every call. The engine instead traces the forward pass once against a
+    fixed input signature (optionally XLA-compiled), warms it up at
+    construction time and then serves direct tensor calls.
+
+    Args:
+        model: Trained Keras model
+        jit_compile: Compile the forward pass with XLA
+        warmup: Trace and time the forward pass immediately
+    """
+
+    def __init__(self, model, jit_compile=False, warmup=True):
+        self.model = model
+        self.jit_compile = jit_compile
+        self.input_spec = _input_spec(model)
+        self.input_dtype = np.dtype(self.input_spec.dtype.as_numpy_dtype)
+        self.input_channels = int(self.input_spec.shape[-1])
+        self._forward = tf.function(
+            lambda images: self.model(images, training=False),
+            input_signature=[self.input_spec],
+            jit_compile=jit_compile,
+            reduce_retracing=True,
+        )
+        self.cold_start_ms = None
+        self._latencies_ms = deque(maxlen=LATENCY_WINDOW)
+
+        if warmup:
+            self.warmup()
+
+    def warmup(self, runs=WARMUP_RUNS):
+        """Trace the forward pass on a dummy input and record latencies."""
+        dummy = np.zeros((1,) + tuple(self.input_spec.shape[1:]), dtype=self.input_dtype)
+
+        start = time.perf_counter()
+        _to_numpy(self._forward(dummy))
+        self.cold_start_ms = (time.perf_counter() - start) * 1000.0
+
+        for _ in range(runs):
+            self.predict(dummy)
+
+    def predict(self, batch):
+        """
+        Run one forward pass.
+
+        Args:
+            batch: NHWC array matching the model's input signature
+
+        Returns:
+            NumPy array of class probabilities, shape (N, num_classes)
+            (a list of arrays for multi-output models)
+        """
+        start = time.perf_counter()
+        images = tf.convert_to_tensor(batch, dtype=self.input_spec.dtype)
+        outputs = _to_numpy(self._forward(images))
+        self._latencies_ms.append((time.perf_counter() - start) * 1000.0)
+        return outputs
+
+    __call__ = predict
+
+    def latency_report(self):
+        """
+        Summarize engine latency.
+
+        Returns:
+            Dict with cold-start latency, steady-state p50/p99 latency (ms)
+            over the recent call window, and the window size
+        """
+        latencies = np.asarray(self._latencies_ms, dtype=np.float64)
+        report = {
+            'cold_start_ms': self.cold_start_ms,
+            'steady_state_p50_ms': None,
+            'steady_state_p99_ms': None,
+            'calls': int(latencies.size),
+            'jit_compile': self.jit_compile,
+        }
+        if latencies.size:
+            report['steady_state_p50_ms'] = float(np.percentile(latencies, 50))
+            report['steady_state_p99_ms'] = float(np.percentile(latencies, 99))
+        return report
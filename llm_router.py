@@ -0,0 +1,322 @@
+"""
+Latency-aware routing across LLM providers for ai_analysis
+Tracks rolling latency and error rates per provider, sends each request to
+the fastest healthy one, hedges slow requests (and slow stream openings) to a
+second provider and stops calling providers that keep failing (circuit breaker). TokenBucket paces
+bulk requests under provider rate limits.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import chain
+
+import numpy as np
+
+import metrics
+
+# Calls remembered per provider for latency percentiles and error rates
+HEALTH_WINDOW = 50
+
+# The hedge delay is this percentile of the primary's recent latencies...
+HEDGE_PERCENTILE = 90
+# ...once it has at least this many samples (DEFAULT_HEDGE_DELAY_S before)
+MIN_HEDGE_SAMPLES = 5
+DEFAULT_HEDGE_DELAY_S = 2.0
+MIN_HEDGE_DELAY_S = 0.05
+
+# Consecutive failures that open a provider's circuit, and seconds it stays open
+FAILURE_THRESHOLD = 3
+COOLDOWN_S = 30.0
+
+# Threads available for in-flight provider requests (hedges included)
+MAX_WORKERS = 32
+
+
+class ProviderHealth:
+    """
+    Rolling latency/error statistics and circuit breaker for one provider.
+
+    The circuit opens after `failure_threshold` consecutive failures. After
+    `cooldown_s` it is half-open: a single trial request is let through, and
+    its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, window=HEALTH_WINDOW, failure_threshold=FAILURE_THRESHOLD,
+                 cooldown_s=COOLDOWN_S):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.calls = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.cooldown_s:
+            return 'half_open'
+        return 'open'
+
+    def available(self):
+        state = self.state
+        return state == 'closed' or (state == 'half_open' and not self.trial_in_flight)
+
+    @property
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def percentile(self, q):
+        """Latency percentile in seconds (None without samples)."""
+        return float(np.percentile(self.latencies, q)) if self.latencies else None
+
+    def expected_latency(self):
+        """Median latency inflated by the error rate (0 while untried, so it gets explored)."""
+        median = self.percentile(50)
+        if median is None:
+            return 0.0
+        return median / max(0.05, 1.0 - self.error_rate)
+
+    def record(self, seconds, ok):
+        """Record one call; `seconds` may be None to skip the latency sample."""
+        self.calls += 1
+        self.outcomes.append(ok)
+        if seconds is not None and ok:
+            self.latencies.append(seconds)
+        if ok:
+            self.consecutive_failures = 0
+            self.opened_at = None
+        else:
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+    def snapshot(self):
+        p50, p90 = self.percentile(50), self.percentile(90)
+        return {
+            'state': self.state,
+            'calls': self.calls,
+            'error_rate': self.error_rate,
+            'p50_ms': p50 * 1000.0 if p50 is not None else None,
+            'p90_ms': p90 * 1000.0 if p90 is not None else None,
+        }
+
+
+class ProviderRouter:
+    """
+    Route requests across providers by observed latency and health.
+
+    Args:
+        calls: Ordered dict of provider name -> blocking call `fn(*args)`;
+            the order breaks ties between providers with equal latency
+        streams: Optional provider name -> function returning a chunk iterator
+        hedge: Send a hedged request to the next provider when the primary is
+            slower than its p90 latency
+        max_workers: Maximum provider requests in flight at once
+    """
+
+    def __init__(self, calls, streams=None, hedge=True, failure_threshold=FAILURE_THRESHOLD,
+                 cooldown_s=COOLDOWN_S, max_workers=MAX_WORKERS):
+        self.calls = dict(calls)
+        self.streams = dict(streams or {})
+        self.hedge = hedge
+        self.health = {name: ProviderHealth(name, failure_threshold=failure_threshold,
+                                            cooldown_s=cooldown_s)
+                       for name in self.calls}
+        self.last_decision = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm')
+
+    def ranked(self):
+        """Providers with a closed (or trial-ready) circuit, fastest first."""
+        with self._lock:
+            order = list(self.health)
+            available = [name for name in order if self.health[name].available()]
+            return sorted(available, key=lambda name: (self.health[name].expected_latency(),
+                                                       order.index(name)))
+
+    def hedge_delay(self, name):
+        """Seconds to wait on `name` before hedging (its p90 latency once known)."""
+        with self._lock:
+            health = self.health[name]
+            if len(health.latencies) < MIN_HEDGE_SAMPLES:
+                return DEFAULT_HEDGE_DELAY_S
+            return max(MIN_HEDGE_DELAY_S, health.percentile(HEDGE_PERCENTILE))
+
+    def _start(self, name):
+        with self._lock:
+            if self.health[name].state == 'half_open':
+                self.health[name].trial_in_flight = True
+
+    def _record(self, name, seconds, ok):
+        with self._lock:
+            self.health[name].record(seconds, ok)
+        if seconds is not None:
+            metrics.REGISTRY.observe(f'llm_{name}', seconds, error=not ok)
+
+    def _timed_call(self, name, fn, args):
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception:
+            self._record(name, time.perf_counter() - start, ok=False)
+            raise
+        self._record(name, time.perf_counter() - start, ok=True)
+        return result
+
+    def _submit(self, name, fn, args):
+        self._start(name)
+        return self._executor.submit(self._timed_call, name, fn, args)
+
+    def call(self, *args):
+        """
+        Run a request on the best provider, hedging and failing over as needed.
+
+        Returns:
+            Tuple of (provider name, result)
+
+        Raises:
+            RuntimeError if every circuit is open, otherwise the last provider error
+        """
+        return self._race(self.calls, args)
+
+    def _race(self, providers, args, discard=None):
+        """
+        Run `providers[name](*args)` on the best provider, hedging and failing over.
+
+        Args:
+            providers: Provider name -> blocking function
+            args: Arguments passed to the provider function
+            discard: Optional function called with the result of a losing
+                hedged request once it completes (e.g. to close a stream)
+        """
+        candidates = [name for name in self.ranked() if name in providers]
+        if not candidates:
+            raise RuntimeError("All AI providers are temporarily unavailable")
+
+        start = time.perf_counter()
+        primary, remaining = candidates[0], candidates[1:]
+        hedge_delay = self.hedge_delay(primary) if self.hedge and remaining else None
+        futures = {self._submit(primary, providers[primary], args): primary}
+        hedged_to, errors = None, []
+
+        while futures:
+            timeout = hedge_delay if hedged_to is None and remaining else None
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Primary is slower than usual: race the next provider against it
+                hedged_to = remaining.pop(0)
+                futures[self._submit(hedged_to, providers[hedged_to], args)] = hedged_to
+                continue
+
+            for future in done:
+                name = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(f"{name}: {e}")
+                    if not futures and remaining:
+                        # Fail over without waiting for the hedge delay
+                        failover = remaining.pop(0)
+                        futures[self._submit(failover, providers[failover], args)] = failover
+                    continue
+
+                self.last_decision = {
+                    'primary': primary,
+                    'hedged_to': hedged_to,
+                    'winner': name,
+                    'hedge_delay_ms': hedge_delay * 1000.0 if hedge_delay is not None else None,
+                    'latency_ms': (time.perf_counter() - start) * 1000.0,
+                    'errors': errors,
+                }
+                if discard is not None:
+                    def discard_loser(future):
+                        if future.exception() is None:
+                            discard(future.result())
+
+                    for loser in futures:
+                        loser.add_done_callback(discard_loser)
+                return name, result
+
+        self.last_decision = {'primary': primary, 'hedged_to': hedged_to, 'winner': None,
+                              'latency_ms': (time.perf_counter() - start) * 1000.0,
+                              'errors': errors}
+        raise RuntimeError("; ".join(errors))
+
+    def open_stream(self, *args):
+        """
+        Open a stream on the best provider, hedging and failing over until one
+        yields a chunk.
+
+        Opening a stream is raced like `call`: the time to the first chunk is
+        the latency sample, a second provider is started once the primary is
+        slower than its hedge delay, and the first stream to produce a chunk
+        wins the whole response (the other one is closed).
+
+        Returns:
+            Tuple of (provider name, chunk iterator)
+        """
+        openers = {name: _first_chunk(stream) for name, stream in self.streams.items()}
+        name, (first, chunks) = self._race(openers, args, discard=_close_stream)
+        return name, chain(first, chunks)
+
+    def stats(self):
+        """Per-provider health snapshot plus the most recent routing decision."""
+        with self._lock:
+            providers = {name: health.snapshot() for name, health in self.health.items()}
+        return {'providers': providers, 'last_decision': self.last_decision}
+
+
+def _first_chunk(stream):
+    """Wrap a stream function so it returns (first chunks, iterator) once output starts."""
+    def open_stream(*args):
+        chunks = iter(stream(*args))
+        try:
+            return [next(chunks)], chunks
+        except StopIteration:
+            return [], chunks
+    return open_stream
+
+
+def _close_stream(opened):
+    """Close the iterator of a stream that lost a hedged race."""
+    close = getattr(opened[1], 'close', None)
+    if close is not None:
+        close()
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket: `rate` requests per second with bursts of up to `capacity`.
+
+    Waiters are served in arrival order.
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError(f"rate must be > 0, got {rate}")
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
@@ -1,14 +1,36 @@
 # ==================================================
 # Spinal Disease Classifier — Portfolio UI (Streamlit-safe)
 # ==================================================
+import time
+
+_IMPORT_START = time.perf_counter()
+
 import os
+import io
 import base64
+import hashlib
+import numpy as np
 import streamlit as st
 from PIL import Image
-from keras.models import load_model
 
-from utils import classify
-from ai_analysis import get_ai_analysis, is_api_configured, get_api_setup_instructions
+import metrics
+from startup import BackgroundLoader
+from utils import (DEFAULT_BATCH_SIZE, IMG_SIZE, classify, classify_batch, classify_tta,
+                   load_labels, model_input_channels, predict_pixels)
+from backends import BACKENDS, load_backend
+from prediction_cache import PredictionCache
+from similar_cases import METADATA_PATH as CASE_INDEX_PATH
+from similar_cases import SimilarCaseIndex, classify_and_embed, load_joint_engine
+from ai_analysis import (
+    get_router,
+    is_api_configured,
+    get_api_setup_instructions,
+    stream_ai_analysis,
+    stream_with_deadline,
+)
+
+# TensorFlow is only imported by the background model loader
+IMPORT_MS = (time.perf_counter() - _IMPORT_START) * 1000.0
 
 # ---------------------------
 # Page config
@@ -20,10 +42,50 @@ st.set_page_config(
 # ---------------------------
 # Paths
 # ---------------------------
-MODEL_PATH = "model/spinal_classifier.keras"
 LABELS_PATH = "model/labels.txt"
 HERO_IMAGE = "assets/hero_bg.png"
 
+# ---------------------------
+# Inference backend
+# ---------------------------
+# SPINE_BACKEND selects keras (default), savedmodel or tflite.
+# Run `python train_model.py export` to produce the savedmodel/tflite artifacts.
+# SPINE_MODEL_PATH overrides the artifact (e.g. a quantized .tflite variant).
+BACKEND = os.getenv("SPINE_BACKEND", "keras")
+MODEL_PATH = os.getenv("SPINE_MODEL_PATH", BACKENDS[BACKEND].default_path)
+
+# Set SPINE_JIT_COMPILE=1 to XLA-compile the keras inference engine
+JIT_COMPILE = os.getenv("SPINE_JIT_COMPILE", "0") == "1"
+
+# Set SPINE_TFLITE_THREADS to pin the TFLite interpreter thread count
+TFLITE_THREADS = os.getenv("SPINE_TFLITE_THREADS")
+
+# Set SPINE_PREDICTION_CACHE=0 to disable the persistent prediction cache
+PREDICTION_CACHE = os.getenv("SPINE_PREDICTION_CACHE", "1") == "1"
+
+# Low-confidence predictions are re-scored with test-time augmentation
+# (SPINE_TTA=0 disables it)
+TTA_ENABLED = os.getenv("SPINE_TTA", "1") == "1"
+TTA_THRESHOLD = 0.70
+TTA_VIEW_COUNT = 8
+
+# Set SPINE_METRICS=1 to record per-stage timings (shown in the sidebar);
+# SPINE_METRICS_LOG=path also appends them to a rolling log
+
+# Nearest labelled cases shown next to the upload (keras backend only;
+# build the index with `python similar_cases.py build`)
+SIMILAR_CASES = 3
+
+# Seconds the streamed AI interpretation may take before the static fallback
+AI_ANALYSIS_DEADLINE_S = 20
+AI_ANALYSIS_FALLBACK = (
+    "AI analysis is taking longer than expected. The classification result and "
+    "recommendations on this page are unaffected — try again in a moment."
+)
+
+# Study mode thumbnails (bounding box, pixels)
+THUMBNAIL_SIZE = (96, 96)
+
 
 # ==================================================
 # Helpers
@@ -36,24 +98,273 @@ def load_image_base64(path: str) -> str:
         return base64.b64encode(f.read()).decode("utf-8")
 
 
-@st.cache_resource
-def load_classifier(model_path: str, labels_path: str):
-    """Load model + labels once per session."""
-    if not os.path.exists(model_path):
-        return None, None
+def backend_options(name: str) -> dict:
+    """Backend-specific options taken from the environment."""
+    if name == "keras":
+        return {"jit_compile": JIT_COMPILE}
+    if name == "tflite":
+        return {"num_threads": int(TFLITE_THREADS) if TFLITE_THREADS else None}
+    return {}
 
-    model = load_model(model_path)
+
+def load_classifier(model_path: str, labels_path: str):
+    """Load the inference backend + labels (without warming the model up)."""
+    options = backend_options(BACKEND)
+    if BACKEND == "keras":
+        # Traced in load_resources' own "warmup" stage
+        options["warmup"] = False
+    model = load_backend(BACKEND, model_path, **options)
 
     if not os.path.exists(labels_path):
         raise FileNotFoundError(f"Labels file not found at: {labels_path}")
 
-    with open(labels_path, "r") as f:
-        # expects lines like: "0 Normal" or "1 Abnormal"
-        labels = [line.strip().split(" ", 1)[1] for line in f if line.strip()]
+    # expects lines like: "0 Normal" or "1 Abnormal"
+    labels = load_labels(labels_path)
 
     return model, labels
 
 
+def load_prediction_cache(model_path: str, labels_path: str):
+    """Open the prediction cache for the current model version (None if disabled)."""
+    if not PREDICTION_CACHE:
+        return None
+    return PredictionCache([model_path, labels_path])
+
+
+def load_case_index(model, model_path: str):
+    """
+    Load the similar-case index, or (None, None) if unavailable.
+
+    Returns a joint engine built from the already loaded classifier, so one
+    forward pass gives both the prediction and the retrieval embedding.
+    Raises if the index was built with a different model (stale after
+    retraining), which hides the panel and shows a warning instead.
+    """
+    if BACKEND != "keras" or not os.path.exists(CASE_INDEX_PATH):
+        return None, None
+    case_index = SimilarCaseIndex()
+    if not case_index.built_with(model_path):
+        raise ValueError("it was built with a different model; "
+                         "rebuild it with `python similar_cases.py build`")
+    return load_joint_engine(model.engine.model, jit_compile=JIT_COMPILE), case_index
+
+
+def load_resources(model_path: str, labels_path: str, profile) -> dict:
+    """
+    Load and warm up everything the prediction path needs.
+
+    Runs on the background loader thread, so it must not call Streamlit;
+    optional components that fail to load are reported through 'warnings'.
+    """
+    with profile.stage("load"):
+        model, class_names = load_classifier(model_path, labels_path)
+
+    # Trace the forward pass (or run a dummy 224x224 inference) so the first
+    # upload does not pay for it
+    with profile.stage("warmup"):
+        if hasattr(model, "warmup"):
+            model.warmup()
+        else:
+            width, height = IMG_SIZE
+            predict_pixels(np.zeros((1, height, width, model_input_channels(model)),
+                                    dtype=np.uint8), model)
+
+    resources = {
+        "model": model,
+        "class_names": class_names,
+        "prediction_cache": None,
+        "embedder": None,
+        "case_index": None,
+        "warnings": [],
+    }
+
+    try:
+        resources["prediction_cache"] = load_prediction_cache(model_path, labels_path)
+    except Exception as e:
+        resources["warnings"].append(f"Prediction cache unavailable: {e}")
+
+    try:
+        resources["embedder"], resources["case_index"] = load_case_index(model, model_path)
+    except Exception as e:
+        resources["warnings"].append(f"Similar-case index unavailable: {e}")
+
+    return resources
+
+
+@st.cache_resource
+def start_model_loader(model_path: str, labels_path: str) -> BackgroundLoader:
+    """Start loading the model in the background once per server process."""
+    loader = BackgroundLoader(lambda profile: load_resources(model_path, labels_path, profile))
+    loader.profile.record("import", IMPORT_MS)
+    return loader
+
+
+def wait_for_resources(loader: BackgroundLoader) -> dict:
+    """Block until the background loader has finished (stops the script if it failed)."""
+    with st.spinner("Loading model..."):
+        try:
+            resources = loader.result()
+        except Exception as e:
+            st.error(f"Error loading model/labels: {e}")
+            st.stop()
+
+    for warning in resources["warnings"]:
+        st.warning(warning)
+    return resources
+
+
+def thumbnail_data_uri(image) -> str:
+    """Downscale an image to THUMBNAIL_SIZE and return it as a JPEG data URI."""
+    thumbnail = image.copy()
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format="JPEG", quality=80)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def decode_upload(upload, model):
+    """
+    Decode an uploaded scan in the model's input mode.
+
+    Grayscale models get an 'L' image, so the prediction-cache hash and the
+    forward pass work on one channel instead of reducing an RGB copy on every
+    call. The same image is used for display and thumbnails.
+    """
+    mode = "L" if model_input_channels(model) == 1 else "RGB"
+    return Image.open(upload).convert(mode)
+
+
+def score_study(files, resources: dict) -> list:
+    """
+    Classify uploaded slices in batched forward passes.
+
+    Results are memoized per file content in the session, so a rerun only
+    scores slices it has not seen before and its cost stays flat as the
+    study grows.
+    """
+    memo = st.session_state.setdefault("study_results", {})
+
+    entries, pending = [], {}
+    for file in files:
+        data = file.getvalue()
+        key = (MODEL_PATH, hashlib.blake2b(data, digest_size=16).hexdigest())
+        entries.append((file.name, key))
+        if key not in memo:
+            pending[key] = data
+
+    if pending:
+        progress = st.progress(0.0, text=f"Scoring {len(pending)} slices...")
+        pending = list(pending.items())
+        for start in range(0, len(pending), DEFAULT_BATCH_SIZE):
+            chunk = pending[start:start + DEFAULT_BATCH_SIZE]
+            with metrics.stage("decode"):
+                images = [decode_upload(io.BytesIO(data), resources["model"])
+                          for _, data in chunk]
+
+            predictions = classify_batch(
+                images,
+                resources["model"],
+                resources["class_names"],
+                batch_size=DEFAULT_BATCH_SIZE,
+                cache=resources["prediction_cache"],
+            )
+            for (key, _), image, (label, confidence) in zip(chunk, images, predictions):
+                memo[key] = {
+                    "label": label,
+                    "confidence": confidence,
+                    "thumbnail": thumbnail_data_uri(image),
+                }
+
+            done = start + len(chunk)
+            progress.progress(done / len(pending), text=f"Scored {done}/{len(pending)} slices")
+        progress.empty()
+
+    return [dict(memo[key], name=name) for name, key in entries]
+
+
+def tta_result(data: bytes, image, model, class_names) -> dict:
+    """
+    Run test-time augmentation once per uploaded file content.
+
+    Streamlit reruns the script on every widget interaction; the result is
+    memoized in the session so the augmented views are only scored once.
+    """
+    memo = st.session_state.setdefault("tta_results", {})
+    key = (MODEL_PATH, TTA_VIEW_COUNT, hashlib.blake2b(data, digest_size=16).hexdigest())
+    if key not in memo:
+        memo[key] = classify_tta(image, model, class_names, views=TTA_VIEW_COUNT)
+    return memo[key]
+
+
+def render_study(results: list):
+    """Summary + sortable table (click a column header to sort) of study results."""
+    st.markdown("### 🗂️ Study Results")
+
+    counts = {}
+    for result in results:
+        counts[result["label"]] = counts.get(result["label"], 0) + 1
+    low_confidence = sum(result["confidence"] <= TTA_THRESHOLD for result in results)
+    st.caption(
+        f"{len(results)} slices — "
+        + ", ".join(f"{label}: {count}" for label, count in sorted(counts.items()))
+        + f" — {low_confidence} at or below {TTA_THRESHOLD:.0%} confidence"
+    )
+
+    st.dataframe(
+        [
+            {
+                "thumbnail": result["thumbnail"],
+                "file": result["name"],
+                "prediction": result["label"],
+                "confidence": result["confidence"],
+            }
+            for result in results
+        ],
+        column_config={
+            "thumbnail": st.column_config.ImageColumn("Slice", width="small"),
+            "file": st.column_config.TextColumn("File"),
+            "prediction": st.column_config.TextColumn("Prediction"),
+            "confidence": st.column_config.ProgressColumn(
+                "Confidence", min_value=0.0, max_value=1.0, format="percent"
+            ),
+        },
+        hide_index=True,
+        use_container_width=True,
+    )
+
+
+def render_ai_analysis(box, class_name: str, confidence: float):
+    """Stream the AI interpretation into `box`, falling back after the deadline."""
+    text = ""
+    with metrics.stage("ai_analysis"):
+        try:
+            chunks = stream_ai_analysis(class_name, confidence)
+            for chunk in stream_with_deadline(chunks, AI_ANALYSIS_DEADLINE_S):
+                text += chunk
+                box.info(text + " ▌")
+        except TimeoutError:
+            box.info(AI_ANALYSIS_FALLBACK)
+            return
+    box.info(text.strip() or "AI analysis unavailable.")
+
+
+def render_similar_cases(embedding, case_index):
+    """Show the nearest labelled cases from the retrieval index."""
+    matches = case_index.query(embedding, k=SIMILAR_CASES)[0]
+    matches = [match for match in matches if os.path.exists(match["path"])]
+    if not matches:
+        return
+
+    st.markdown("### 🔎 Similar Labelled Cases")
+    for column, match in zip(st.columns(len(matches)), matches):
+        with column:
+            st.image(
+                match["path"],
+                caption=f"{match['label']} · similarity {match['similarity']:.2f}",
+                use_container_width=True,
+            )
+
+
 def inject_global_css():
     """Global styling that plays nicely with Streamlit."""
     st.markdown(
@@ -269,41 +580,93 @@ st.divider()
 # ==================================================
 # Load model
 # ==================================================
-try:
-    model, class_names = load_classifier(MODEL_PATH, LABELS_PATH)
-except Exception as e:
-    st.error(f"Error loading model/labels: {e}")
-    st.stop()
-
-if model is None:
+if not os.path.exists(MODEL_PATH):
     st.error(
-        "Model not found. Train or place the model at: model/spinal_classifier.keras"
+        f"Model not found. Train or place the model at: {MODEL_PATH}"
     )
-    st.info("Expected paths:\n- model/spinal_classifier.keras\n- model/labels.txt")
+    st.info(f"Expected paths:\n- {MODEL_PATH}\n- {LABELS_PATH}")
     st.stop()
 
+# Loads + warms up on a background thread; only the prediction path waits on it
+model_loader = start_model_loader(MODEL_PATH, LABELS_PATH)
+startup_profile = model_loader.profile
+
 # ==================================================
 # Upload
 # ==================================================
 st.markdown("## Upload a Lumbar Spine MRI Scan")
-uploaded_file = st.file_uploader(
-    "Upload an MRI scan (JPG / PNG)", type=["jpg", "jpeg", "png"]
+study_mode = st.toggle(
+    "Study mode — upload several slices at once",
+    help="Scores every slice in batched passes and lists the results in one table.",
 )
+if study_mode:
+    uploaded_files = st.file_uploader(
+        "Upload MRI slices (JPG / PNG)",
+        type=["jpg", "jpeg", "png"],
+        accept_multiple_files=True,
+        key="study_upload",
+    )
+    uploaded_file = None
+else:
+    uploaded_file = st.file_uploader(
+        "Upload an MRI scan (JPG / PNG)", type=["jpg", "jpeg", "png"]
+    )
+    uploaded_files = []
 
 # ==================================================
 # Prediction UI
 # ==================================================
+pending_analysis = None
+
+if uploaded_files:
+    resources = wait_for_resources(model_loader)
+    st.divider()
+    render_study(score_study(uploaded_files, resources))
+
 if uploaded_file:
+    resources = wait_for_resources(model_loader)
+
+    model, class_names = resources["model"], resources["class_names"]
+    prediction_cache = resources["prediction_cache"]
+    embedder, case_index = resources["embedder"], resources["case_index"]
+
     st.divider()
     left, right = st.columns([1, 1], gap="large")
 
     with left:
-        image = Image.open(uploaded_file).convert("RGB")
+        with metrics.stage("upload"):
+            upload = io.BytesIO(uploaded_file.getvalue())
+        with metrics.stage("decode"):
+            image = decode_upload(upload, model)
         st.image(image, caption="Uploaded MRI Scan", use_container_width=True)
 
+        # Filled in once the (shared) forward pass has produced the embedding
+        similar_box = st.container() if case_index is not None else None
+
     with right:
         with st.spinner("Analyzing MRI scan..."):
-            class_name, confidence = classify(image, model, class_names)
+            inference_start = time.perf_counter()
+            if embedder is not None:
+                # One forward pass gives both the prediction and the embedding
+                probabilities, embedding = classify_and_embed(image, embedder)
+                index = int(np.argmax(probabilities))
+                class_name, confidence = class_names[index], float(probabilities[index])
+            else:
+                class_name, confidence = classify(
+                    image, model, class_names, cache=prediction_cache
+                )
+            startup_profile.record(
+                "first_inference", (time.perf_counter() - inference_start) * 1000.0
+            )
+
+            tta = None
+            if TTA_ENABLED and confidence <= TTA_THRESHOLD:
+                tta = tta_result(uploaded_file.getvalue(), image, model, class_names)
+                class_name, confidence = tta["class_name"], tta["confidence"]
+
+        if similar_box is not None:
+            with similar_box:
+                render_similar_cases(embedding, case_index)
 
         st.markdown("### 🎯 Classification Result")
 
@@ -314,14 +677,20 @@ if uploaded_file:
 
         st.markdown(f"**Confidence:** {confidence:.2%}")
         st.progress(float(confidence))
+        if tta:
+            st.caption(
+                f"Low first-pass confidence — averaged over {tta['views']} augmented "
+                f"views (view disagreement: {tta['disagreement']:.0%})."
+            )
 
         st.divider()
 
         st.markdown("### 🤖 AI Interpretation")
         if is_api_configured():
-            with st.spinner("Generating AI analysis..."):
-                analysis = get_ai_analysis(class_name, confidence)
-            st.info(analysis if analysis else "AI analysis unavailable.")
+            # Filled in at the end of the script so the rest of the page renders first
+            ai_box = st.empty()
+            ai_box.info("Generating AI analysis...")
+            pending_analysis = (ai_box, class_name, confidence)
         else:
             with st.expander("Enable AI Analysis (Optional)"):
                 st.markdown(get_api_setup_instructions())
@@ -370,6 +739,69 @@ with st.sidebar:
         """
     )
 
+    st.caption(f"Inference backend: {BACKEND}")
+    prediction_cache = None
+    if not model_loader.done():
+        st.caption("Model warming up in the background…")
+    else:
+        try:
+            loaded = model_loader.result()
+        except Exception:
+            loaded = None
+
+        model = loaded["model"] if loaded else None
+        latency = model.latency_report() if hasattr(model, "latency_report") else None
+        if latency and latency["steady_state_p50_ms"] is not None:
+            st.caption(
+                f"Inference latency — cold start: {latency['cold_start_ms']:.0f} ms, "
+                f"steady state (p50): {latency['steady_state_p50_ms']:.1f} ms"
+            )
+
+        prediction_cache = loaded["prediction_cache"] if loaded else None
+        if prediction_cache is not None:
+            cache_stats = prediction_cache.stats()
+            st.caption(
+                f"Prediction cache — hits: {cache_stats['hits']}, "
+                f"misses: {cache_stats['misses']}, "
+                f"stored: {cache_stats['disk_entries']}"
+            )
+
+    llm_router = get_router()
+    if llm_router is not None and llm_router.last_decision:
+        st.caption(
+            "AI providers — "
+            + "; ".join(
+                f"{name}: {health['state']}"
+                + (f", p50 {health['p50_ms']:.0f} ms" if health["p50_ms"] is not None else "")
+                for name, health in llm_router.stats()["providers"].items()
+            )
+        )
+
+    startup_timings = startup_profile.as_dict()
+    if startup_timings:
+        st.caption(
+            "Startup — "
+            + ", ".join(f"{stage.replace('_', ' ')}: {ms:.0f} ms"
+                        for stage, ms in startup_timings.items())
+        )
+
+    if metrics.REGISTRY.enabled:
+        stage_timings = metrics.REGISTRY.summary()
+        with st.expander("⏱️ Stage Timings"):
+            if stage_timings:
+                st.table([
+                    {
+                        "stage": stage,
+                        "calls": row["count"],
+                        "p50 ms": f"{row['p50_ms']:.1f}",
+                        "p95 ms": f"{row['p95_ms']:.1f}",
+                        "errors": row["errors"],
+                    }
+                    for stage, row in stage_timings.items()
+                ])
+            else:
+                st.caption("No predictions yet.")
+
     st.divider()
 
     st.markdown("## 📌 Best Practices")
@@ -384,6 +816,10 @@ with st.sidebar:
     st.divider()
 
     if st.button("Clear Cache"):
+        if prediction_cache is not None:
+            prediction_cache.clear()
+        st.session_state.pop("study_results", None)
+        st.session_state.pop("tta_results", None)
         st.cache_data.clear()
         st.cache_resource.clear()
         st.success("Cache cleared")
@@ -403,3 +839,9 @@ st.markdown(
     """,
     unsafe_allow_html=True,
 )
+
+# ==================================================
+# AI interpretation (streamed last so nothing above waits on the LLM)
+# ==================================================
+if pending_analysis:
+    render_ai_analysis(*pending_analysis)
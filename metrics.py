@@ -0,0 +1,196 @@
+"""
+Per-stage timing metrics for the Spinal Disease Classifier prediction pipeline
+Stage timers feed histograms and counters that can be exported in Prometheus
+text format or appended to a rolling JSON-lines log
+
+Metrics are disabled by default; `stage()` then returns a shared no-op
+context manager, so instrumented code pays a single attribute check.
+Enable them with SPINE_METRICS=1 (and SPINE_METRICS_LOG=path for the log).
+
+Usage:
+    import metrics
+    with metrics.stage('decode'):
+        image = Image.open(path).convert('RGB')
+    print(metrics.REGISTRY.prometheus_text())
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from logging.handlers import RotatingFileHandler
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Recent observations kept per stage for the sidebar panel
+RECENT_WINDOW = 50
+
+# Rolling log size before rotation, and number of rotated files kept
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+
+_DISABLED = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram plus a window of recent values (seconds)."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+        self.recent = deque(maxlen=RECENT_WINDOW)
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe collection of per-stage histograms and named counters.
+
+    Args:
+        enabled: Record observations (when False every hook is a no-op)
+        log_path: Optional rolling JSON-lines log receiving every observation
+    """
+
+    def __init__(self, enabled=False, log_path=None):
+        self.enabled = enabled
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._log = None
+        if log_path:
+            self.set_log(log_path)
+
+    def set_log(self, log_path):
+        """Append every observation to `log_path`, rotating at LOG_MAX_BYTES."""
+        logger = logging.getLogger(f'{__name__}.{os.path.abspath(log_path)}')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        if not logger.handlers:
+            logger.addHandler(RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES,
+                                                  backupCount=LOG_BACKUPS))
+        self._log = logger
+
+    def stage(self, name):
+        """Context manager timing one execution of pipeline stage `name`."""
+        if not self.enabled:
+            return _DISABLED
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, error)
+
+    def observe(self, name, seconds, error=False):
+        """Record one stage duration (seconds)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+            if error:
+                histogram.errors += 1
+        if self._log is not None:
+            self._log.info(json.dumps({'ts': time.time(), 'stage': name,
+                                       'ms': round(seconds * 1000.0, 3), 'error': error}))
+
+    def increment(self, name, amount=1):
+        """Add `amount` to counter `name`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def summary(self):
+        """Per-stage count, errors and last/p50/p95 of recent durations in ms."""
+        with self._lock:
+            snapshot = {name: (h.count, h.errors, sorted(h.recent))
+                        for name, h in self._histograms.items()}
+        rows = {}
+        for name, (count, errors, recent) in snapshot.items():
+            rows[name] = {
+                'count': count,
+                'errors': errors,
+                'p50_ms': recent[len(recent) // 2] * 1000.0,
+                'p95_ms': recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000.0,
+            }
+        return rows
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def prometheus_text(self, prefix='spine'):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            name = f'{prefix}_stage_duration_seconds'
+            lines += [f'# HELP {name} Time spent in each prediction pipeline stage.',
+                      f'# TYPE {name} histogram']
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',),
+                                        histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+
+            name = f'{prefix}_stage_errors_total'
+            lines += [f'# HELP {name} Stage executions that raised an exception.',
+                      f'# TYPE {name} counter']
+            for stage, histogram in sorted(self._histograms.items()):
+                lines.append(f'{name}{{stage="{stage}"}} {histogram.errors}')
+
+            for counter, value in sorted(self._counters.items()):
+                lines += [f'# TYPE {prefix}_{counter} counter', f'{prefix}_{counter} {value}']
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+REGISTRY = MetricsRegistry(enabled=os.getenv('SPINE_METRICS', '0') == '1',
+                           log_path=os.getenv('SPINE_METRICS_LOG'))
+
+
+def stage(name):
+    """Time pipeline stage `name` in the process-wide registry."""
+    return REGISTRY.stage(name)
+
+
+def increment(name, amount=1):
+    """Add to a counter in the process-wide registry."""
+    REGISTRY.increment(name, amount)
+
+
+def enable(log_path=None):
+    """Turn on the process-wide registry (optionally with a rolling log)."""
+    REGISTRY.enabled = True
+    if log_path:
+        REGISTRY.set_log(log_path)
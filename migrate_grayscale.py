@@ -0,0 +1,131 @@
+"""
+Migrate an image tree to single-channel (grayscale) PNGs
+Older exports stored every MRI slice as RGB with three identical channels;
+this rewrites them in place as 8-bit 'L' PNGs (pixel-for-pixel identical)
+and reports the bytes and decode time saved
+
+Usage:
+    python migrate_grayscale.py --dry-run        # report only, write nothing
+    python migrate_grayscale.py                  # rewrite data/ in place
+    python migrate_grayscale.py --force          # also reduce colour images
+"""
+
+import argparse
+import io
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from utils import IMG_SIZE, list_images, load_image_array
+
+DATA_DIR = 'data'
+
+# Decode timings keep the fastest of this many runs per image
+DECODE_REPEATS = 3
+
+
+def is_single_channel(image):
+    """True if an image is already stored with one (non-palette) band."""
+    return image.mode != 'P' and len(image.getbands()) == 1
+
+
+def channels_identical(image):
+    """True if an image carries no colour: equal RGB channels, fully opaque."""
+    pixels = np.asarray(image.convert('RGBA'))
+    return (np.array_equal(pixels[..., 0], pixels[..., 1])
+            and np.array_equal(pixels[..., 1], pixels[..., 2])
+            and bool(np.all(pixels[..., 3] == 255)))
+
+
+def _decode_seconds(data, channels):
+    """Fastest time to decode and resize encoded image bytes as the pipeline does."""
+    best = float('inf')
+    for _ in range(DECODE_REPEATS):
+        start = time.perf_counter()
+        load_image_array(Image.open(io.BytesIO(data)), channels=channels)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def migrate(data_dir=DATA_DIR, dry_run=False, force=False):
+    """
+    Rewrite every multi-channel image under `data_dir` as an 'L' PNG.
+
+    Images whose channels differ (real colour) are left alone unless `force`
+    is set, since reducing them to luminance loses information. Files are
+    replaced atomically; with `dry_run` the converted PNGs are only encoded
+    in memory to measure them.
+
+    Returns:
+        Dict with counts of converted / already single-channel / skipped
+        colour images, and total bytes and decode (+ resize) seconds of the
+        converted images before and after
+    """
+    summary = {'converted': 0, 'single_channel': 0, 'colour': 0,
+               'bytes_before': 0, 'bytes_after': 0,
+               'decode_before_s': 0.0, 'decode_after_s': 0.0}
+    for path in list_images(data_dir):
+        with open(path, 'rb') as f:
+            original = f.read()
+        image = Image.open(io.BytesIO(original))
+
+        if is_single_channel(image):
+            summary['single_channel'] += 1
+            continue
+        if not force and not channels_identical(image):
+            print(f"⚠️  Skipping colour image {path} (use --force to convert)")
+            summary['colour'] += 1
+            continue
+
+        buffer = io.BytesIO()
+        image.convert('L').save(buffer, format='PNG', optimize=True)
+        converted = buffer.getvalue()
+
+        summary['converted'] += 1
+        summary['bytes_before'] += len(original)
+        summary['bytes_after'] += len(converted)
+        summary['decode_before_s'] += _decode_seconds(original, channels=3)
+        summary['decode_after_s'] += _decode_seconds(converted, channels=1)
+
+        if not dry_run:
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(converted)
+            os.replace(temp_path, path)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate images to single-channel PNGs")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Report the savings without rewriting any file")
+    parser.add_argument('--force', action='store_true',
+                        help="Also convert images whose channels differ (lossy)")
+    args = parser.parse_args()
+
+    summary = migrate(args.data_dir, dry_run=args.dry_run, force=args.force)
+    action = "Would convert" if args.dry_run else "Converted"
+    print(f"\n✅ {action} {summary['converted']} images "
+          f"({summary['single_channel']} already single-channel, "
+          f"{summary['colour']} colour images skipped)")
+    if not summary['converted']:
+        return
+
+    width, height = IMG_SIZE
+    print("=" * 60)
+    print(f"{'':<24} {'RGB':>12} {'grayscale':>12} {'ratio':>8}")
+    rows = [
+        ('on disk (MB)', summary['bytes_before'] / 1e6, summary['bytes_after'] / 1e6),
+        ('decode + resize (s)', summary['decode_before_s'], summary['decode_after_s']),
+        ('decoded per image (KB)', width * height * 3 / 1e3, width * height / 1e3),
+    ]
+    for name, before, after in rows:
+        print(f"{name:<24} {before:>12.3f} {after:>12.3f} {before / after:>7.2f}x")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Persistent, content-addressed prediction cache for the Spinal Disease Classifier
+Predictions are keyed by a hash of the decoded pixels plus a fingerprint of the
+model artifact and labels, so retraining invalidates old entries automatically
+"""
+
+import hashlib
+import os
+import time
+
+from PIL import Image
+
+from sqlite_cache import SQLiteCache
+
+CACHE_PATH = 'model/prediction_cache.sqlite3'
+
+# Entries kept in the in-process LRU front
+MEMORY_SIZE = 256
+
+# Entries kept on disk before the least recently used are evicted
+MAX_ENTRIES = 10000
+
+# Seconds between writes of the access times of in-memory hits to disk
+TOUCH_INTERVAL = 5.0
+
+
+def fingerprint_files(*paths):
+    """Hash the contents of files/directories (e.g. model + labels) into one digest."""
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name)
+                           for root, _, names in os.walk(path) for name in names)
+        else:
+            files = [path]
+        for file_path in files:
+            digest.update(os.path.relpath(file_path, path).encode())
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+def image_key(image):
+    """
+    Hash the decoded pixels of an image.
+
+    Args:
+        image: PIL Image object or path to an image file
+
+    Returns:
+        Hex digest identifying the pixel content (independent of file name/format)
+    """
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class PredictionCache(SQLiteCache):
+    """
+    SQLite-backed prediction store with an in-memory LRU front.
+
+    Lookups only match entries of the current model fingerprint. On open,
+    entries of a previous fingerprint of the same model artifact (e.g. before
+    retraining) are purged; other artifacts sharing the database (e.g. the
+    Keras UI and a TFLite server) keep theirs. In-memory hits refresh the
+    on-disk access time in batches, so LRU eviction keeps hot entries.
+
+    Args:
+        model_paths: Files whose contents define the model version
+            (model artifact and labels file)
+        path: SQLite database path
+        memory_size: Entries kept in the in-process LRU
+        max_entries: Entries kept on disk before LRU eviction
+    """
+
+    table = 'predictions'
+
+    def __init__(self, model_paths, path=CACHE_PATH, memory_size=MEMORY_SIZE,
+                 max_entries=MAX_ENTRIES):
+        super().__init__(path, memory_size, schema=(
+            """CREATE TABLE IF NOT EXISTS predictions (
+                   image_hash TEXT NOT NULL,
+                   model_fingerprint TEXT NOT NULL,
+                   class_name TEXT NOT NULL,
+                   confidence REAL NOT NULL,
+                   accessed REAL NOT NULL,
+                   PRIMARY KEY (image_hash, model_fingerprint))""",
+            "CREATE INDEX IF NOT EXISTS predictions_accessed ON predictions (accessed)",
+            """CREATE TABLE IF NOT EXISTS fingerprints (
+                   model_key TEXT PRIMARY KEY,
+                   model_fingerprint TEXT NOT NULL)""",
+        ))
+        self.max_entries = max_entries
+        self.model_fingerprint = fingerprint_files(*model_paths)
+        self._touched = {}
+        self._last_touch = time.monotonic()
+
+        # Invalidate the previous version of this artifact in one transaction
+        model_key = '\0'.join(os.path.abspath(path) for path in model_paths)
+        with self._lock, self._db:
+            previous = self._db.execute(
+                "SELECT model_fingerprint FROM fingerprints WHERE model_key = ?",
+                (model_key,),
+            ).fetchone()
+            if previous is not None and previous[0] != self.model_fingerprint:
+                self._db.execute("DELETE FROM predictions WHERE model_fingerprint = ?",
+                                 previous)
+            self._db.execute("INSERT OR REPLACE INTO fingerprints VALUES (?, ?)",
+                             (model_key, self.model_fingerprint))
+
+    key_for = staticmethod(image_key)
+
+    def get(self, key):
+        """Return the cached (class_name, confidence) for `key`, or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._count_hit(memory=True)
+                self._touched[key] = time.time()
+                if time.monotonic() - self._last_touch >= TOUCH_INTERVAL:
+                    with self._db:
+                        self._flush_touches()
+                return self._memory[key]
+
+            row = self._db.execute(
+                "SELECT class_name, confidence FROM predictions "
+                "WHERE image_hash = ? AND model_fingerprint = ?",
+                (key, self.model_fingerprint),
+            ).fetchone()
+            if row is None:
+                self._count_miss()
+                return None
+
+            with self._db:
+                self._db.execute(
+                    "UPDATE predictions SET accessed = ? "
+                    "WHERE image_hash = ? AND model_fingerprint = ?",
+                    (time.time(), key, self.model_fingerprint),
+                )
+            self._count_hit()
+            self._remember(key, row)
+            return row
+
+    def _flush_touches(self):
+        """Write the access times of pending in-memory hits (caller holds the lock)."""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE predictions SET accessed = ? "
+                "WHERE image_hash = ? AND model_fingerprint = ?",
+                [(accessed, key, self.model_fingerprint)
+                 for key, accessed in self._touched.items()],
+            )
+            self._touched.clear()
+        self._last_touch = time.monotonic()
+
+    def put(self, key, class_name, confidence):
+        """Store a prediction, evicting the least recently used entries if full."""
+        value = (class_name, float(confidence))
+        with self._lock:
+            self._remember(key, value)
+            with self._db:
+                self._flush_touches()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)",
+                    (key, self.model_fingerprint, value[0], value[1], time.time()),
+                )
+                self._db.execute(
+                    "DELETE FROM predictions WHERE rowid IN ("
+                    "  SELECT rowid FROM predictions ORDER BY accessed DESC "
+                    "  LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
@@ -0,0 +1,292 @@
+"""
+Headless batch scoring for directories of spine MRI scans
+Decodes images in a thread pool while the model scores batches and streams
+results to JSONL or CSV. Re-running resumes where an interrupted run stopped.
+
+Usage:
+    python score_images.py data/validation --output scores.jsonl
+    python score_images.py /path/to/scans --output scores.csv --backend tflite
+    python score_images.py /path/to/scans --output scores.jsonl --processes 4 --threads 2
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backends import BACKENDS, load_backend
+from utils import (DEFAULT_BATCH_SIZE, IMAGE_EXTENSIONS, IMG_CHANNELS, IMG_SIZE,
+                   load_image_array, load_labels, model_input_channels, predict_pixels)
+from worker_pool import WorkerPool
+
+LABELS_PATH = 'model/labels.txt'
+
+FIELDS = ['path', 'label', 'confidence', 'decode_ms', 'inference_ms', 'error']
+
+
+def iter_image_paths(root):
+    """Lazily yield image paths under `root` in a stable (sorted) order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(dirpath, name)
+
+
+def walk_key(path, root):
+    """
+    Sort key of `path` in iter_image_paths(root) order.
+
+    A directory's files come before its subdirectories, each sorted by name.
+    """
+    parts = os.path.relpath(path, root).split(os.sep)
+    return tuple((1, part) for part in parts[:-1]) + ((0, parts[-1]),)
+
+
+def output_format(path, fmt=None):
+    """Return 'csv' or 'jsonl' (explicit, or from the output file extension)."""
+    if fmt:
+        return fmt
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def _is_complete(row):
+    """True if a result row has every field and was either scored or failed."""
+    return (all(field in row for field in FIELDS) and bool(row['path'])
+            and bool(row['label'] or row['error']))
+
+
+def _json_rows(f):
+    for line in f:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # Truncated last line from an interrupted run
+            continue
+
+
+def resume_point(output, fmt):
+    """
+    Path of the last complete row in `output` (None if there is none).
+
+    Rows are written in iter_image_paths order, so every image up to this
+    path has been recorded. The file is streamed, keeping one row in memory.
+    """
+    if not os.path.exists(output):
+        return None
+
+    last = None
+    with open(output, 'r', newline='') as f:
+        if fmt == 'csv':
+            # Short (truncated) rows get None for their missing fields
+            rows = (row for row in csv.DictReader(f) if None not in row.values())
+        else:
+            rows = _json_rows(f)
+        for row in rows:
+            if isinstance(row, dict) and _is_complete(row):
+                last = row['path']
+    return last
+
+
+def _truncate_partial_line(output):
+    """Cut a partially written last line (from an interrupted run) off `output`."""
+    with open(output, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if not size:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+        # Scan back to the end of the last complete line
+        position = size
+        while position > 0:
+            start = max(0, position - 65536)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b'\n')
+            if newline != -1:
+                f.truncate(start + newline + 1)
+                return
+            position = start
+        f.truncate(0)
+
+
+class ResultWriter:
+    """Append scoring rows to a JSONL or CSV file, flushing after every batch."""
+
+    def __init__(self, output, fmt):
+        exists = os.path.exists(output) and os.path.getsize(output) > 0
+        self._file = open(output, 'a', newline='')
+        self._fmt = fmt
+
+        self._csv = None
+        if fmt == 'csv':
+            self._csv = csv.DictWriter(self._file, fieldnames=FIELDS)
+            if not exists:
+                self._csv.writeheader()
+
+    def write(self, row):
+        if self._csv is not None:
+            self._csv.writerow(row)
+        else:
+            self._file.write(json.dumps(row) + '\n')
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _decode(path, channels=IMG_CHANNELS):
+    """Decode one image; returns (pixels or None, decode_ms, error or None)."""
+    start = time.perf_counter()
+    try:
+        pixels = load_image_array(path, channels=channels)
+        error = None
+    except Exception as e:
+        pixels, error = None, str(e)
+    return pixels, (time.perf_counter() - start) * 1000.0, error
+
+
+def score_directory(root, model, class_names, output, fmt=None,
+                    batch_size=DEFAULT_BATCH_SIZE, workers=4, prefetch_batches=2):
+    """
+    Score every image under `root`, streaming results to `output`.
+
+    At most `prefetch_batches * batch_size` decoded images are held in memory,
+    regardless of how many files the tree contains. Resuming keeps only the
+    last recorded path and skips every image up to it in walk order.
+
+    Args:
+        root: Directory walked recursively for images
+        model: Trained Keras model or inference backend
+        class_names: List of class names
+        output: JSONL or CSV path (appended to; already scored images are skipped)
+        fmt: 'jsonl' or 'csv' (inferred from `output` when None)
+        batch_size: Images per forward pass
+        workers: Decode threads
+        prefetch_batches: Batches decoded ahead of the model
+
+    Returns:
+        Dict with counts of scored, failed and skipped images and elapsed seconds
+    """
+    fmt = output_format(output, fmt)
+    if os.path.exists(output):
+        # Drop a partially written last row from an interrupted run
+        _truncate_partial_line(output)
+    resume = resume_point(output, fmt)
+    resume_key = walk_key(resume, root) if resume is not None else None
+    paths = iter_image_paths(root)
+
+    width, height = IMG_SIZE
+    channels = model_input_channels(model)
+    pixels = np.empty((batch_size, height, width, channels), dtype=np.uint8)
+    window = prefetch_batches * batch_size
+    summary = {'scored': 0, 'failed': 0, 'skipped': 0}
+    start = time.perf_counter()
+
+    writer = ResultWriter(output, fmt)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+
+            def schedule():
+                """Keep the decode window full."""
+                while len(pending) < window:
+                    path = next(paths, None)
+                    if path is None:
+                        return
+                    if resume_key is not None and walk_key(path, root) <= resume_key:
+                        summary['skipped'] += 1
+                        continue
+                    pending.append((path, pool.submit(_decode, path, channels)))
+
+            schedule()
+            while pending:
+                batch = []
+                while pending and len(batch) < batch_size:
+                    path, future = pending.popleft()
+                    batch.append((path,) + future.result())
+
+                # Queue the next decodes so they overlap this forward pass
+                schedule()
+
+                decoded = [item for item in batch if item[1] is not None]
+                for i, (_, image, _, _) in enumerate(decoded):
+                    pixels[i] = image
+
+                inference_ms = 0.0
+                if decoded:
+                    infer_start = time.perf_counter()
+                    prediction = predict_pixels(pixels[:len(decoded)], model)
+                    inference_ms = (time.perf_counter() - infer_start) * 1000.0 / len(decoded)
+                    scores = iter(prediction)
+
+                for path, image, decode_ms, error in batch:
+                    row = {'path': path, 'label': None, 'confidence': None,
+                           'decode_ms': round(decode_ms, 3), 'inference_ms': None,
+                           'error': error}
+                    if image is not None:
+                        probabilities = next(scores)
+                        index = int(np.argmax(probabilities))
+                        row.update(label=class_names[index],
+                                   confidence=float(probabilities[index]),
+                                   inference_ms=round(inference_ms, 3))
+                        summary['scored'] += 1
+                    else:
+                        summary['failed'] += 1
+                    writer.write(row)
+                writer.flush()
+    finally:
+        writer.close()
+
+    summary['elapsed_s'] = time.perf_counter() - start
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-score a directory of spine MRI scans")
+    parser.add_argument('root', help="Directory searched recursively for images")
+    parser.add_argument('--output', '-o', required=True, help="Results file (.jsonl or .csv)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default=None)
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='keras')
+    parser.add_argument('--model-path', default=None,
+                        help="Model artifact (defaults to the backend's standard path)")
+    parser.add_argument('--labels', default=LABELS_PATH)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=4, help="Decode threads")
+    parser.add_argument('--processes', type=int, default=0,
+                        help="Inference worker processes (0 = score in this process)")
+    parser.add_argument('--threads', type=int, default=1,
+                        help="Intra-op threads per inference worker process")
+    args = parser.parse_args()
+
+    class_names = load_labels(args.labels)
+    if args.processes:
+        model = WorkerPool(args.backend, args.model_path, workers=args.processes,
+                           intra_op_threads=args.threads)
+    else:
+        model = load_backend(args.backend, args.model_path)
+
+    print(f"🔍 Scoring images under {args.root} -> {args.output}")
+    try:
+        summary = score_directory(args.root, model, class_names, args.output, args.format,
+                                  batch_size=args.batch_size, workers=args.workers)
+    finally:
+        if args.processes:
+            model.close()
+
+    rate = summary['scored'] / summary['elapsed_s'] if summary['elapsed_s'] else 0.0
+    print(f"✅ Scored {summary['scored']} images ({rate:.1f} images/s), "
+          f"{summary['failed']} failed, {summary['skipped']} already in output")
+
+
+if __name__ == '__main__':
+    main()
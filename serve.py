@@ -0,0 +1,260 @@
+"""
+Standalone HTTP inference server for the Spinal Disease Classifier
+Loads the classifier once and coalesces concurrent uploads into micro-batches
+
+Usage:
+    python serve.py --port 8000
+    curl -F image=@data/validation/with_pain/spine_0000.png localhost:8000/predict
+
+Endpoints:
+    POST /predict   multipart field "image" (or a raw image body)
+                    -> {"label": ..., "confidence": ...}
+    GET  /health    -> {"status": "ok", "backend": ...}
+    GET  /queue     -> queue depth and micro-batching statistics
+    GET  /metrics   -> per-stage timing histograms (Prometheus text format)
+"""
+
+import argparse
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tornado.web
+from PIL import Image
+
+import metrics
+from backends import BACKENDS, load_backend
+from utils import load_image_array, load_labels, model_input_channels, predict_pixels
+from worker_pool import WorkerPool
+
+LABELS_PATH = 'model/labels.txt'
+
+# Micro-batching defaults
+MAX_BATCH_SIZE = 32
+MAX_DELAY_MS = 5.0
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-image requests into batched forward passes.
+
+    A batch is dispatched as soon as it holds `max_batch_size` images or the
+    oldest queued image has waited `max_delay_ms`, whichever comes first.
+    Inference runs on `concurrency` dedicated threads (one unless a worker
+    pool is serving) so the event loop stays free to accept and decode new
+    uploads meanwhile.
+    """
+
+    def __init__(self, model, max_batch_size=MAX_BATCH_SIZE, max_delay_ms=MAX_DELAY_MS,
+                 concurrency=1):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000.0
+        self.concurrency = concurrency
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency,
+                                            thread_name_prefix='inference')
+        self.batches = 0
+        self.images = 0
+        self.in_flight = 0
+
+    @property
+    def depth(self):
+        """Images waiting for a batch slot."""
+        return self._queue.qsize()
+
+    async def submit(self, pixels):
+        """Queue one decoded uint8 image; resolves to its class probabilities."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((pixels, future))
+        return await future
+
+    async def _collect(self):
+        """Wait for the first image, then fill the batch until full or the delay expires."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _infer(self, batch):
+        """Score one batch on the inference executor and resolve its futures."""
+        loop = asyncio.get_running_loop()
+        pixels = np.stack([item[0] for item in batch])
+        self.in_flight += len(batch)
+        try:
+            probabilities = await loop.run_in_executor(
+                self._executor, predict_pixels, pixels, self.model)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), row in zip(batch, probabilities):
+                if not future.done():
+                    future.set_result(row)
+        finally:
+            self.in_flight -= len(batch)
+
+        self.batches += 1
+        self.images += len(batch)
+
+    async def run(self):
+        """Batching loop; runs for the lifetime of the server."""
+        slots = asyncio.Semaphore(self.concurrency)
+        while True:
+            await slots.acquire()
+            batch = await self._collect()
+            task = asyncio.create_task(self._infer(batch))
+            task.add_done_callback(lambda _: slots.release())
+
+    def stats(self):
+        return {
+            'queue_depth': self.depth,
+            'in_flight': self.in_flight,
+            'batches': self.batches,
+            'images': self.images,
+            'mean_batch_size': self.images / self.batches if self.batches else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'max_delay_ms': self.max_delay * 1000.0,
+        }
+
+
+def decode_upload(body, channels=3):
+    """Decode uploaded image bytes into a resized uint8 array with `channels` channels."""
+    return load_image_array(Image.open(io.BytesIO(body)), channels=channels)
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, app_state):
+        self.state = app_state
+
+    def write_error(self, status_code, **kwargs):
+        exception = kwargs.get('exc_info', (None, None))[1]
+        message = self._reason
+        if isinstance(exception, tornado.web.HTTPError) and exception.log_message:
+            message = exception.log_message % exception.args
+        self.finish({'error': message})
+
+
+class PredictHandler(BaseHandler):
+    async def post(self):
+        start = time.perf_counter()
+        uploads = self.request.files.get('image') or self.request.files.get('file')
+        body = uploads[0]['body'] if uploads else self.request.body
+        if not body:
+            raise tornado.web.HTTPError(400, "No image uploaded")
+
+        loop = asyncio.get_running_loop()
+        try:
+            pixels = await loop.run_in_executor(self.state['decode_pool'], decode_upload, body,
+                                                self.state['channels'])
+        except Exception as e:
+            raise tornado.web.HTTPError(400, "Could not decode image: %s", e)
+
+        probabilities = await self.state['batcher'].submit(pixels)
+        index = int(np.argmax(probabilities))
+        elapsed = time.perf_counter() - start
+        metrics.REGISTRY.observe('request', elapsed)
+        self.write({
+            'label': self.state['class_names'][index],
+            'confidence': float(probabilities[index]),
+            'latency_ms': elapsed * 1000.0,
+        })
+
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.write({'status': 'ok', 'backend': self.state['backend']})
+
+
+class QueueHandler(BaseHandler):
+    def get(self):
+        self.write(self.state['batcher'].stats())
+
+
+class MetricsHandler(BaseHandler):
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.write(metrics.REGISTRY.prometheus_text())
+
+
+def make_app(model, class_names, backend='keras', max_batch_size=MAX_BATCH_SIZE,
+             max_delay_ms=MAX_DELAY_MS, decode_workers=4, inference_concurrency=1):
+    """
+    Build the tornado application and its micro-batcher.
+
+    The caller must schedule `batcher.run()` on the running event loop.
+
+    Returns:
+        Tuple of (tornado.web.Application, MicroBatcher)
+    """
+    batcher = MicroBatcher(model, max_batch_size, max_delay_ms, inference_concurrency)
+    state = {
+        'batcher': batcher,
+        'class_names': class_names,
+        'backend': backend,
+        'channels': model_input_channels(model),
+        'decode_pool': ThreadPoolExecutor(max_workers=decode_workers,
+                                          thread_name_prefix='decode'),
+    }
+    app = tornado.web.Application([
+        (r'/predict', PredictHandler, {'app_state': state}),
+        (r'/health', HealthHandler, {'app_state': state}),
+        (r'/queue', QueueHandler, {'app_state': state}),
+        (r'/metrics', MetricsHandler, {'app_state': state}),
+    ])
+    return app, batcher
+
+
+async def serve(args):
+    metrics.enable(args.metrics_log)
+    class_names = load_labels(args.labels)
+    if args.processes:
+        model = WorkerPool(args.backend, args.model_path, workers=args.processes,
+                           intra_op_threads=args.threads)
+    else:
+        model = load_backend(args.backend, args.model_path)
+
+    app, batcher = make_app(model, class_names, args.backend, args.max_batch_size,
+                            args.max_delay_ms, args.decode_workers,
+                            inference_concurrency=max(1, args.processes))
+    app.listen(args.port, address=args.host)
+    print(f"🚀 Serving {args.backend} model on http://{args.host}:{args.port} "
+          f"(max batch {args.max_batch_size}, max delay {args.max_delay_ms} ms)")
+    await batcher.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spinal Disease Classifier HTTP server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='keras')
+    parser.add_argument('--model-path', default=None,
+                        help="Model artifact (defaults to the backend's standard path)")
+    parser.add_argument('--labels', default=LABELS_PATH)
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument('--max-delay-ms', type=float, default=MAX_DELAY_MS)
+    parser.add_argument('--decode-workers', type=int, default=4)
+    parser.add_argument('--processes', type=int, default=0,
+                        help="Inference worker processes (0 = infer in the server process)")
+    parser.add_argument('--threads', type=int, default=1,
+                        help="Intra-op threads per inference worker process")
+    parser.add_argument('--metrics-log', default=None,
+                        help="Also append per-stage timings to this rolling JSON-lines log")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+"""
+Embedding extraction and similar-case retrieval for the Spinal Disease Classifier
+Embeds labelled scans with the classifier's penultimate layer into a float16
+memory-mapped matrix and answers top-k cosine-similarity queries
+
+Usage:
+    python similar_cases.py build                       # index data/train
+    python similar_cases.py append new_scan.png ...     # add images
+    python similar_cases.py query scan.png --k 5
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+import metrics
+from float16_matrix import Float16Matrix
+from utils import (DEFAULT_BATCH_SIZE, list_images, load_image_array, model_input_channels,
+                   model_input_dtype, predict_batch)
+
+MODEL_PATH = 'model/spinal_classifier.keras'
+LABELS_PATH = 'model/labels.txt'
+INDEX_PATH = 'model/case_index.f16'
+METADATA_PATH = 'model/case_index.json'
+TRAIN_DIR = 'data/train'
+
+# Rows converted to float32 at a time when scoring a query
+SEARCH_CHUNK = 65536
+
+
+def embedding_model(model):
+    """
+    Cut a trained classifier at its penultimate layer.
+
+    Walks back from the final classification layer, skipping Dropout (an
+    identity at inference), and returns a Keras model producing that layer's
+    output (the Dense(128) features in build_model).
+    """
+    import keras
+
+    layers = model.layers
+    index = len(layers) - 2
+    while index > 0 and isinstance(layers[index], keras.layers.Dropout):
+        index -= 1
+    return keras.Model(model.inputs, layers[index].output, name='embedding')
+
+
+def joint_model(model):
+    """
+    Give a trained classifier a second output: its penultimate-layer embedding.
+
+    The returned model shares layers (and weights) with `model`, so a single
+    forward pass yields both [class probabilities, embeddings].
+    """
+    import keras
+
+    return keras.Model(model.inputs, [model.outputs[0], embedding_model(model).outputs[0]],
+                       name='classifier_embedding')
+
+
+def load_embedder(model_path=MODEL_PATH, jit_compile=False):
+    """Load the Keras checkpoint and wrap its embedding model in an InferenceEngine."""
+    from keras.models import load_model
+    from inference import InferenceEngine
+
+    return InferenceEngine(embedding_model(load_model(model_path)), jit_compile=jit_compile)
+
+
+def load_joint_engine(model, jit_compile=False):
+    """Wrap an already loaded Keras classifier's joint_model in an InferenceEngine."""
+    from inference import InferenceEngine
+
+    return InferenceEngine(joint_model(model), jit_compile=jit_compile)
+
+
+def _normalize(embeddings):
+    """L2-normalize embedding rows as float32."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def embed_images(images, embedder, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Embed images in batches.
+
+    Args:
+        images: Sequence of PIL Image objects and/or image file paths
+        embedder: Embedding model or engine (see load_embedder)
+        batch_size: Images per forward pass
+
+    Returns:
+        float32 array of L2-normalized embeddings, shape (N, dim)
+    """
+    return _normalize(predict_batch(images, embedder, batch_size=batch_size))
+
+
+def classify_and_embed(image, engine):
+    """
+    Classify and embed one image in a single forward pass.
+
+    Args:
+        image: PIL Image object or path to an image file
+        engine: Joint classifier/embedder engine (see load_joint_engine)
+
+    Returns:
+        Tuple of (class probabilities, L2-normalized embedding)
+    """
+    pixels = load_image_array(image, channels=model_input_channels(engine))[np.newaxis]
+    if np.issubdtype(model_input_dtype(engine), np.floating):
+        pixels = pixels.astype(np.float32) / 255.0
+    metrics.increment('images_scored_total', 1)
+    with metrics.stage('predict'):
+        probabilities, embeddings = engine.predict(pixels)
+    return probabilities[0], _normalize(embeddings)[0]
+
+
+class SimilarCaseIndex:
+    """
+    Float16 memory-mapped embedding matrix with a JSON metadata sidecar.
+
+    Rows are L2-normalized so cosine similarity is a single matrix-vector
+    product. New rows are appended to the end of the matrix file in place.
+
+    Args:
+        index_path: Raw float16 matrix file
+        metadata_path: JSON sidecar holding dim, model fingerprint and per-row
+            {'path', 'label'} entries
+    """
+
+    def __init__(self, index_path=INDEX_PATH, metadata_path=METADATA_PATH):
+        self.index_path = index_path
+        self.metadata_path = metadata_path
+        self._store = Float16Matrix(index_path, metadata_path)
+        self.metadata = self._store.read_metadata()
+        self.dim = self.metadata['dim']
+        self.items = self.metadata['items']
+
+    @property
+    def matrix(self):
+        """Memory-mapped (count, dim) float16 embedding matrix."""
+        return self._store.view(len(self.items), self.dim)
+
+    @classmethod
+    def create(cls, embeddings, items, model_fingerprint=None,
+               index_path=INDEX_PATH, metadata_path=METADATA_PATH):
+        """Write a new index from (N, dim) embeddings and N metadata dicts."""
+        store = Float16Matrix(index_path, metadata_path)
+        embeddings = store.write(embeddings)
+        store.write_metadata({'dim': int(embeddings.shape[1]),
+                              'model_fingerprint': model_fingerprint,
+                              'items': list(items)}, indent=1)
+        return cls(index_path, metadata_path)
+
+    def append(self, embeddings, items):
+        """Append rows to the matrix file and sidecar without rewriting existing rows."""
+        embeddings = np.asarray(embeddings)
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim embeddings, got {embeddings.shape[1]}")
+        self._store.write(embeddings, append=True)
+        self.items.extend(items)
+        self._store.write_metadata(self.metadata, indent=1)
+
+    def built_with(self, model_path):
+        """True if the index was built from the model artifact at `model_path`."""
+        return self.metadata.get('model_fingerprint') == model_fingerprint(model_path)
+
+    def query(self, embeddings, k=5):
+        """
+        Top-k cosine search.
+
+        Args:
+            embeddings: L2-normalized query embedding(s), shape (dim,) or (M, dim)
+            k: Number of neighbours per query
+
+        Returns:
+            List (one per query) of lists of dicts with the item metadata plus
+            'similarity', best first
+        """
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        matrix = self.matrix
+        k = min(k, len(matrix))
+        if k == 0:
+            return [[] for _ in queries]
+
+        scores = np.empty((len(matrix), len(queries)), dtype=np.float32)
+        for start in range(0, len(matrix), SEARCH_CHUNK):
+            block = matrix[start:start + SEARCH_CHUNK].astype(np.float32)
+            scores[start:start + len(block)] = block @ queries.T
+
+        results = []
+        for column in scores.T:
+            top = np.argpartition(-column, k - 1)[:k]
+            top = top[np.argsort(-column[top])]
+            results.append([dict(self.items[i], similarity=float(column[i])) for i in top])
+        return results
+
+
+def model_fingerprint(model_path):
+    """Content fingerprint of a model artifact, stored in the index metadata."""
+    from prediction_cache import fingerprint_files
+    return fingerprint_files(model_path)
+
+
+def build_index(embedder, data_dir=TRAIN_DIR, model_path=MODEL_PATH,
+                index_path=INDEX_PATH, metadata_path=METADATA_PATH):
+    """Embed every image under `data_dir` (label = parent folder) into a new index."""
+    paths = list_images(data_dir)
+    if not paths:
+        raise FileNotFoundError(f"No images found in {data_dir}")
+    embeddings = embed_images(paths, embedder)
+    items = [{'path': str(path), 'label': path.parent.name} for path in paths]
+    return SimilarCaseIndex.create(embeddings, items, model_fingerprint(model_path),
+                                   index_path, metadata_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Similar-case retrieval index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help="Embed a labelled directory into a new index")
+    build.add_argument('--data-dir', default=TRAIN_DIR)
+
+    append = subparsers.add_parser('append', help="Add images to the index")
+    append.add_argument('images', nargs='+')
+    append.add_argument('--label', default=None,
+                        help="Label for all images (default: parent folder name)")
+
+    query = subparsers.add_parser('query', help="Find the most similar indexed cases")
+    query.add_argument('image')
+    query.add_argument('--k', type=int, default=5)
+
+    args = parser.parse_args()
+    embedder = load_embedder()
+
+    if args.command == 'build':
+        index = build_index(embedder, args.data_dir)
+        print(f"✅ Indexed {len(index.items)} images ({index.dim}-dim) -> {INDEX_PATH}")
+    elif args.command == 'append':
+        index = SimilarCaseIndex()
+        embeddings = embed_images(args.images, embedder)
+        index.append(embeddings, [
+            {'path': path, 'label': args.label or os.path.basename(os.path.dirname(path))}
+            for path in args.images])
+        print(f"✅ Appended {len(args.images)} images ({len(index.items)} total)")
+    else:
+        index = SimilarCaseIndex()
+        if not index.built_with(MODEL_PATH):
+            print("⚠️  Index was built with a different model; rebuild it for accurate results")
+        for rank, match in enumerate(index.query(embed_images([args.image], embedder)[0],
+                                                 args.k)[0], 1):
+            print(f"{rank}. {match['similarity']:.3f}  {match['label']:<15} {match['path']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Shared base for the persistent caches of the Spinal Disease Classifier
+A SQLite table holds the entries on disk and a bounded in-process LRU sits in
+front of it; subclasses define the table and how keys map onto it
+"""
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class SQLiteCache:
+    """
+    SQLite-backed store with an in-memory LRU front and hit/miss counters.
+
+    Subclasses set `table`, pass their schema statements to `__init__` and
+    implement `get`/`put` on top of `_db`, `_lock`, `_remember` and
+    `_count_hit`/`_count_miss`.
+
+    Args:
+        path: SQLite database path
+        memory_size: Entries kept in the in-process LRU
+        schema: SQL statements creating the table (and indexes) if missing
+    """
+
+    table = None
+
+    def __init__(self, path, memory_size, schema=()):
+        self.path = path
+        self.memory_size = memory_size
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            for statement in schema:
+                self._db.execute(statement)
+
+    def _remember(self, key, value):
+        """Insert or refresh `key` in the LRU front, evicting the oldest entries."""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _count_hit(self, memory=False):
+        self.hits += 1
+        if memory:
+            self.memory_hits += 1
+
+    def _count_miss(self):
+        self.misses += 1
+
+    def clear(self):
+        """Drop every cached entry."""
+        with self._lock:
+            self._memory.clear()
+            with self._db:
+                self._db.execute(f"DELETE FROM {self.table}")
+
+    def stats(self):
+        """Return hit/miss counters and current entry counts."""
+        with self._lock:
+            entries = self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.hits - self.memory_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'disk_entries': entries,
+            }
@@ -0,0 +1,77 @@
+"""
+Startup helpers for the Spinal Disease Classifier UI
+Loads and warms up the model on a background thread and records a startup
+profile (import, load, warm-up and first-inference timings)
+
+Only the standard library is imported here so the Streamlit page can render
+before TensorFlow is loaded.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Stages in the order they happen during a cold start
+STARTUP_STAGES = ('import', 'load', 'warmup', 'first_inference')
+
+
+class StartupProfile:
+    """Thread-safe record of how long each startup stage took, in milliseconds."""
+
+    def __init__(self):
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, elapsed_ms):
+        """Record a stage (first measurement wins) and log it to the console."""
+        with self._lock:
+            if stage in self._timings:
+                return
+            self._timings[stage] = elapsed_ms
+        print(f"⏱️  Startup {stage}: {elapsed_ms:.0f} ms")
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a `with` block as startup stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000.0)
+
+    def has(self, stage):
+        with self._lock:
+            return stage in self._timings
+
+    def as_dict(self):
+        """Recorded stages in startup order."""
+        with self._lock:
+            return {stage: self._timings[stage]
+                    for stage in STARTUP_STAGES if stage in self._timings}
+
+
+class BackgroundLoader:
+    """
+    Run a loader function once on a background thread.
+
+    Callers that only want to know whether loading has finished use `done()`;
+    callers that need the loaded resources block on `result()`.
+
+    Args:
+        load_fn: Called as `load_fn(profile)`, returns the loaded resources
+        profile: StartupProfile passed to `load_fn` (a new one if None)
+    """
+
+    def __init__(self, load_fn, profile=None):
+        self.profile = profile or StartupProfile()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-loader')
+        self._future = self._executor.submit(load_fn, self.profile)
+        self._executor.shutdown(wait=False)
+
+    def done(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        """Wait for the loaded resources (re-raises any loading error)."""
+        return self._future.result(timeout=timeout)
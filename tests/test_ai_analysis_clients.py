@@ -0,0 +1,116 @@
+"""Pooled clients, retries and timeouts of ai_analysis against the fake provider."""
+
+import asyncio
+import json
+import threading
+import time
+import urllib.request
+
+import pytest
+import tornado.httpserver
+import tornado.testing
+
+import ai_analysis
+from benchmarks.fake_llm_server import make_app
+
+
+@pytest.fixture
+def fake_provider(monkeypatch):
+    """Start benchmarks.fake_llm_server on a free port and point Groq clients at it."""
+    servers = []
+
+    def start(**options):
+        """Serve make_app(**options); returns a function reading the server's /stats."""
+        loop = asyncio.new_event_loop()
+        sock, port = tornado.testing.bind_unused_port()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            server = tornado.httpserver.HTTPServer(make_app(**options))
+            server.add_sockets([sock])
+            servers.append((loop, server))
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        base_url = f'http://127.0.0.1:{port}'
+        monkeypatch.setenv('GROQ_BASE_URL', base_url)
+
+        def stats():
+            with urllib.request.urlopen(f'{base_url}/stats', timeout=5) as response:
+                return json.load(response)
+        return stats
+
+    ai_analysis.close_clients()
+    yield start
+    ai_analysis.close_clients()
+    for loop, server in servers:
+        loop.call_soon_threadsafe(server.stop)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+@pytest.fixture
+def recorded_backoff(monkeypatch):
+    """Record retry delays, shortened to keep the tests fast."""
+    delays = []
+
+    def retry_delay(attempt):
+        delays.append(attempt)
+        return 0.01
+
+    monkeypatch.setattr(ai_analysis, '_retry_delay', retry_delay)
+    return delays
+
+
+def test_retries_server_error_then_succeeds(fake_provider, recorded_backoff):
+    stats = fake_provider(fail_first=1, fail_status=503)
+
+    analysis = ai_analysis._get_groq_analysis('with_pain', 0.9, 'test-retry')
+
+    assert analysis.startswith('This result is consistent')
+    assert stats() == {'requests': 2, 'failures': 1}
+    assert recorded_backoff == [0]
+
+
+def test_gives_up_after_max_retries(fake_provider, recorded_backoff):
+    stats = fake_provider(fail_first=10, fail_status=503)
+
+    with pytest.raises(Exception) as error:
+        ai_analysis._get_groq_analysis('with_pain', 0.9, 'test-give-up')
+
+    assert getattr(error.value, 'status_code', None) == 503
+    assert stats()['requests'] == ai_analysis.MAX_RETRIES + 1
+    assert recorded_backoff == list(range(ai_analysis.MAX_RETRIES))
+
+
+def test_slow_read_times_out(fake_provider, recorded_backoff, monkeypatch):
+    monkeypatch.setattr(ai_analysis, 'READ_TIMEOUT_S', 0.2)
+    stats = fake_provider(delay_ms=5000)
+
+    start = time.perf_counter()
+    with pytest.raises(Exception) as error:
+        ai_analysis._get_groq_analysis('with_pain', 0.9, 'test-timeout')
+    elapsed = time.perf_counter() - start
+
+    assert 'Timeout' in type(error.value).__name__
+    # Every attempt is cut off at the read timeout instead of waiting 5 s
+    attempts = ai_analysis.MAX_RETRIES + 1
+    assert stats()['requests'] == attempts
+    assert elapsed < attempts * 0.2 + 1.0
+
+
+def test_repeated_calls_reuse_one_client(fake_provider, monkeypatch):
+    fake_provider()
+    created = []
+    create_client = ai_analysis._create_client
+
+    def counting_create_client(provider, api_key):
+        created.append(provider)
+        return create_client(provider, api_key)
+
+    monkeypatch.setattr(ai_analysis, '_create_client', counting_create_client)
+
+    for _ in range(3):
+        ai_analysis._get_groq_analysis('without_pain', 0.8, 'test-reuse')
+
+    assert created == ['groq']
+    assert ai_analysis.get_client('groq', 'test-reuse') is ai_analysis.get_client('groq', 'test-reuse')
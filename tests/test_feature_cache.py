@@ -0,0 +1,35 @@
+"""Cached backbone features of train_model.fast_train."""
+
+import numpy as np
+
+from feature_cache import FeatureCache
+from train_model import cache_features
+
+
+class FlattenExtractor:
+    """Backbone stand-in whose 'features' are the pixels themselves."""
+
+    def predict_on_batch(self, images):
+        return images.reshape(len(images), -1).astype(np.float32)
+
+
+def open_cache(tmp_path, name):
+    return FeatureCache('test', str(tmp_path / f'{name}.f16'), str(tmp_path / f'{name}.json'))
+
+
+def test_augmented_views_do_not_depend_on_cache_state(tmp_path):
+    pixels = np.random.default_rng(0).integers(0, 256, (6, 8, 8, 1), dtype=np.uint8)
+    hashes = [f'{index:02x}' * 16 for index in range(6)]
+    keys = [(key, copy) for key in hashes for copy in range(3)]
+
+    fresh = open_cache(tmp_path, 'fresh')
+    cache_features(pixels, hashes, FlattenExtractor(), fresh, copies=2)
+
+    # Re-run after a partial cache: the remaining images land in other batches
+    resumed = open_cache(tmp_path, 'resumed')
+    cache_features(pixels[:3], hashes[:3], FlattenExtractor(), resumed, copies=2)
+    cache_features(pixels, hashes, FlattenExtractor(), resumed, copies=2)
+
+    np.testing.assert_array_equal(fresh.get(keys), resumed.get(keys))
+    # Copies differ from the original view
+    assert not np.array_equal(fresh.get([(hashes[0], 0)]), fresh.get([(hashes[0], 1)]))
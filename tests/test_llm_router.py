@@ -0,0 +1,203 @@
+"""Hedging, failover, circuit breaking and pacing of llm_router with fake providers."""
+
+import asyncio
+import time
+
+import pytest
+
+import llm_router
+from llm_router import ProviderRouter, TokenBucket
+
+
+def reply(name, delay=0.0):
+    """Fake provider call answering `name` after `delay` seconds."""
+    def call(prompt):
+        time.sleep(delay)
+        return f"{name}: {prompt}"
+    return call
+
+
+def failing(name):
+    def call(prompt):
+        raise ConnectionError(f"{name} is down")
+    return call
+
+
+@pytest.fixture
+def fast_hedging(monkeypatch):
+    """Hedge after 50 ms instead of the production default."""
+    monkeypatch.setattr(llm_router, 'DEFAULT_HEDGE_DELAY_S', 0.05)
+
+
+def test_routes_to_fastest_provider():
+    router = ProviderRouter({'slow': reply('slow', 0.05), 'fast': reply('fast')}, hedge=False)
+    # Both are tried once (untried providers are explored first)
+    router.call('x')
+    router.call('x')
+
+    assert router.ranked() == ['fast', 'slow']
+    assert router.call('x') == ('fast', 'fast: x')
+
+
+def test_hedges_slow_primary(fast_hedging):
+    router = ProviderRouter({'slow': reply('slow', 1.0), 'fast': reply('fast')})
+
+    start = time.perf_counter()
+    assert router.call('x') == ('fast', 'fast: x')
+    assert time.perf_counter() - start < 0.5
+
+    decision = router.last_decision
+    assert decision['primary'] == 'slow'
+    assert decision['hedged_to'] == 'fast'
+    assert decision['winner'] == 'fast'
+
+
+def test_no_hedge_when_primary_answers_in_time(fast_hedging):
+    router = ProviderRouter({'a': reply('a'), 'b': reply('b')})
+    assert router.call('x') == ('a', 'a: x')
+    assert router.last_decision['hedged_to'] is None
+    assert router.health['b'].calls == 0
+
+
+def test_fails_over_to_next_provider():
+    router = ProviderRouter({'down': failing('down'), 'up': reply('up')})
+
+    assert router.call('x') == ('up', 'up: x')
+    assert router.last_decision['errors'] == ['down: down is down']
+    assert router.health['down'].consecutive_failures == 1
+
+
+def test_raises_when_every_provider_fails():
+    router = ProviderRouter({'a': failing('a'), 'b': failing('b')})
+    with pytest.raises(RuntimeError, match='a is down.*b is down'):
+        router.call('x')
+
+
+def test_circuit_opens_then_half_opens_after_cooldown():
+    calls = {'flaky': 0}
+
+    def flaky(prompt):
+        calls['flaky'] += 1
+        if calls['flaky'] <= 2:
+            raise ConnectionError("flaky is down")
+        return f"flaky: {prompt}"
+
+    router = ProviderRouter({'flaky': flaky, 'backup': reply('backup')},
+                            hedge=False, failure_threshold=2, cooldown_s=0.2)
+    router.call('x')
+    router.call('x')
+    health = router.health['flaky']
+    assert health.state == 'open'
+    assert router.ranked() == ['backup']
+
+    # Open: the failing provider is not called at all
+    router.call('x')
+    assert calls['flaky'] == 2
+
+    time.sleep(0.25)
+    assert health.state == 'half_open'
+    assert 'flaky' in router.ranked()
+
+    # A single trial is let through while half-open
+    router._start('flaky')
+    assert 'flaky' not in router.ranked()
+    router._record('flaky', 0.01, ok=True)
+    assert health.state == 'closed'
+
+
+def test_failed_trial_reopens_circuit():
+    router = ProviderRouter({'down': failing('down'), 'backup': reply('backup')},
+                            hedge=False, failure_threshold=1, cooldown_s=0.1)
+    router.call('x')
+    assert router.health['down'].state == 'open'
+
+    time.sleep(0.15)
+    assert router.health['down'].state == 'half_open'
+    # The trial request fails and the circuit opens again immediately
+    router.call('x')
+    assert router.health['down'].state == 'open'
+
+
+def test_all_circuits_open_raises():
+    router = ProviderRouter({'a': failing('a')}, failure_threshold=1, cooldown_s=60)
+    with pytest.raises(RuntimeError):
+        router.call('x')
+    with pytest.raises(RuntimeError, match='temporarily unavailable'):
+        router.call('x')
+
+
+def test_stream_fails_over_before_first_chunk():
+    def broken_stream(prompt):
+        raise ConnectionError("stream refused")
+        yield
+
+    router = ProviderRouter({'a': reply('a'), 'b': reply('b')},
+                            streams={'a': broken_stream, 'b': lambda prompt: iter(['b1', 'b2'])})
+    name, chunks = router.open_stream('x')
+    assert name == 'b'
+    assert list(chunks) == ['b1', 'b2']
+    assert router.health['a'].consecutive_failures == 1
+
+
+def test_token_bucket_paces_after_burst():
+    async def acquire_times(bucket, count):
+        start = time.monotonic()
+        times = []
+        for _ in range(count):
+            await bucket.acquire()
+            times.append(time.monotonic() - start)
+        return times
+
+    times = asyncio.run(acquire_times(TokenBucket(rate=20, capacity=2), 6))
+
+    # The burst is immediate, then one token every 50 ms
+    assert times[1] < 0.02
+    assert times[-1] == pytest.approx(4 / 20, abs=0.05)
+
+
+def test_token_bucket_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def streaming(name, delay=0.0, closed=None):
+    """Fake stream function yielding two chunks, the first after `delay` seconds."""
+    def stream(prompt):
+        try:
+            time.sleep(delay)
+            yield f"{name}1"
+            yield f"{name}2"
+        finally:
+            if closed is not None:
+                closed.append(name)
+    return stream
+
+
+def test_stream_records_time_to_first_chunk():
+    router = ProviderRouter({'a': reply('a')}, streams={'a': streaming('a', 0.05)})
+
+    name, chunks = router.open_stream('x')
+    assert (name, list(chunks)) == ('a', ['a1', 'a2'])
+
+    health = router.health['a']
+    assert health.calls == 1
+    assert health.percentile(50) == pytest.approx(0.05, abs=0.04)
+    assert router.last_decision['latency_ms'] >= 50
+
+
+def test_hedges_slow_primary_stream(fast_hedging):
+    closed = []
+    router = ProviderRouter({'slow': reply('slow'), 'fast': reply('fast')},
+                            streams={'slow': streaming('slow', 0.5, closed),
+                                     'fast': streaming('fast')})
+
+    start = time.perf_counter()
+    name, chunks = router.open_stream('x')
+    assert time.perf_counter() - start < 0.3
+    assert (name, list(chunks)) == ('fast', ['fast1', 'fast2'])
+    assert router.last_decision['hedged_to'] == 'fast'
+
+    # The losing stream is closed once it opens, and its latency is still recorded
+    time.sleep(0.6)
+    assert 'slow' in closed
+    assert len(router.health['slow'].latencies) == 1
@@ -0,0 +1,49 @@
+"""Fingerprint invalidation and LRU bookkeeping of prediction_cache."""
+
+import prediction_cache
+from prediction_cache import PredictionCache
+
+
+def write(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_retraining_purges_only_the_same_artifact(tmp_path):
+    db = str(tmp_path / 'cache.sqlite3')
+    keras_model = write(tmp_path / 'model.keras', b'v1')
+    tflite_model = write(tmp_path / 'model.tflite', b'lite')
+
+    PredictionCache([keras_model], path=db).put('scan', 'normal', 0.9)
+    PredictionCache([tflite_model], path=db).put('scan', 'normal', 0.8)
+
+    write(tmp_path / 'model.keras', b'v2')
+    retrained = PredictionCache([keras_model], path=db)
+    assert retrained.get('scan') is None
+    assert retrained.stats()['disk_entries'] == 1
+    assert PredictionCache([tflite_model], path=db).get('scan') == ('normal', 0.8)
+
+
+def test_reopening_unchanged_model_keeps_entries(tmp_path):
+    db = str(tmp_path / 'cache.sqlite3')
+    model = write(tmp_path / 'model.keras', b'v1')
+
+    PredictionCache([model], path=db).put('scan', 'normal', 0.9)
+    assert PredictionCache([model], path=db).get('scan') == ('normal', 0.9)
+
+
+def test_memory_hits_keep_entries_hot_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(prediction_cache, 'TOUCH_INTERVAL', 0.0)
+    model = write(tmp_path / 'model.keras', b'v1')
+    cache = PredictionCache([model], path=str(tmp_path / 'cache.sqlite3'), max_entries=2)
+
+    cache.put('hot', 'normal', 0.9)
+    cache.put('cold', 'normal', 0.8)
+    assert cache.get('hot') == ('normal', 0.9)
+    assert cache.memory_hits == 1
+
+    # The disk trim drops the least recently used entry, not the hot one
+    cache.put('new', 'normal', 0.7)
+    cache._memory.clear()
+    assert cache.get('hot') is not None
+    assert cache.get('cold') is None
@@ -0,0 +1,86 @@
+"""Resuming score_images after an interrupted run."""
+
+import csv
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from score_images import FIELDS, iter_image_paths, resume_point, score_directory, walk_key
+
+CLASS_NAMES = ['with_pain', 'without_pain']
+
+
+class ConstantModel:
+    """Model stand-in returning the same probabilities for every image."""
+
+    input_dtype = np.dtype(np.uint8)
+    input_channels = 1
+
+    def predict(self, batch):
+        return np.tile([[0.25, 0.75]], (len(batch), 1)).astype(np.float32)
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    root = tmp_path / 'scans'
+    root.mkdir()
+    for index in range(3):
+        Image.new('L', (32, 32), color=index * 40).save(root / f'slice_{index}.png')
+    return root
+
+
+def read_rows(output, fmt):
+    with open(output, newline='') as f:
+        if fmt == 'csv':
+            return list(csv.DictReader(f))
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl'])
+def test_resume_rescores_truncated_last_row(image_dir, tmp_path, fmt):
+    output = tmp_path / f'scores.{fmt}'
+    score_directory(str(image_dir), ConstantModel(), CLASS_NAMES, str(output))
+    complete = output.read_bytes()
+
+    # Interrupted while writing the last row: cut it after the confidence
+    last_row = complete.rstrip(b'\r\n').rsplit(b'\n', 1)[1]
+    cut = len(complete.rstrip(b'\r\n')) - len(last_row) + last_row.index(b'0.75') + 4
+    output.write_bytes(complete[:cut])
+    assert resume_point(str(output), fmt) == str(image_dir / 'slice_1.png')
+
+    summary = score_directory(str(image_dir), ConstantModel(), CLASS_NAMES, str(output))
+    assert summary['skipped'] == 2
+    assert summary['scored'] == 1
+
+    rows = read_rows(output, fmt)
+    assert [row['path'] for row in rows] == sorted(str(p) for p in image_dir.iterdir())
+    for row in rows:
+        assert set(row) == set(FIELDS)
+        assert row['label'] == 'without_pain'
+        assert row['decode_ms'] not in (None, '')
+        assert row['inference_ms'] not in (None, '')
+
+
+def test_walk_key_matches_walk_order(tmp_path):
+    for relative in ['b.png', 'a/z.png', 'a/b/c.png', 'a/a.png', 'c/a.png', 'z.png']:
+        path = tmp_path / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new('L', (4, 4)).save(path)
+
+    paths = list(iter_image_paths(str(tmp_path)))
+    assert paths == sorted(paths, key=lambda path: walk_key(path, str(tmp_path)))
+
+
+def test_resume_skips_up_to_last_recorded_path(image_dir, tmp_path):
+    output = tmp_path / 'scores.jsonl'
+    score_directory(str(image_dir), ConstantModel(), CLASS_NAMES, str(output))
+
+    # New scans sorting before and after the resume point
+    Image.new('L', (32, 32)).save(image_dir / 'slice_0a.png')
+    Image.new('L', (32, 32)).save(image_dir / 'slice_3.png')
+    summary = score_directory(str(image_dir), ConstantModel(), CLASS_NAMES, str(output))
+
+    assert summary['skipped'] == 4
+    assert read_rows(output, 'jsonl')[-1]['path'] == str(image_dir / 'slice_3.png')
@@ -4,6 +4,10 @@ Uses MobileNet-V2 for transfer learning on lumbar spine MRI images
 """
 
 import os
+import json
+import time
+import random
+import argparse
 import numpy as np
 import tensorflow as tf
 from tensorflow import keras
@@ -13,6 +17,13 @@ from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from sklearn.metrics import classification_report, confusion_matrix
 import matplotlib.pyplot as plt
 
+from backends import (SAVEDMODEL_PATH, TFLITE_PATH, PARITY_TOLERANCE, SavedModelBackend,
+                      TFLiteBackend, check_parity)
+from dataset_shards import class_names_from_directory, load_shard
+from feature_cache import FeatureCache
+from utils import (IMG_CHANNELS, list_images, load_image_array, load_labels, match_channels,
+                   model_input_channels, model_input_dtype, predict_pixel_batches)
+
 import tensorflow as tf
 import keras
 print("TF version:", tf.__version__)
@@ -30,6 +41,31 @@ TRAIN_DIR = 'data/train'
 VAL_DIR = 'data/validation'
 # MODEL_SAVE_PATH = 'model/spinal_classifier.h5'
 MODEL_SAVE_PATH = 'model/spinal_classifier.keras'
+LABELS_PATH = 'model/labels.txt'
+
+# Post-training quantization
+QUANTIZED_MODEL_PATHS = {
+    'dynamic_range': 'model/spinal_classifier_dynamic_range.tflite',
+    'float16': 'model/spinal_classifier_float16.tflite',
+    'int8': 'model/spinal_classifier_int8.tflite',
+}
+REPRESENTATIVE_SAMPLES = 100
+QUANTIZATION_REPORT_PATH = 'model/quantization_report.json'
+
+# tf.data input pipeline: decoded images are cached in memory, or on disk
+# under this path prefix when set (e.g. SPINE_DATA_CACHE=/tmp/spine_cache)
+DATA_CACHE = os.getenv('SPINE_DATA_CACHE', '')
+SHUFFLE_SEED = 42
+
+# Training augmentation ranges (shared by ImageDataGenerator and random_affine)
+ROTATION_DEGREES = 20
+SHIFT_RANGE = 0.2
+ZOOM_RANGE = 0.2
+
+# Fast-train mode: augmented copies of each training image whose backbone
+# features are cached (besides the original), and images per backbone pass
+FEATURE_AUGMENT_COPIES = 4
+FEATURE_BATCH_SIZE = 32
 
 
 def check_dataset():
@@ -59,25 +95,34 @@ def check_dataset():
 
 
 def create_data_generators():
-    """Create data generators with augmentation for training."""
+    """
+    Create data generators with augmentation for training.
+
+    Generators yield raw uint8 pixels with IMG_CHANNELS channels; rescaling
+    to [0, 1] (and grayscale-to-RGB replication) happens inside the model
+    (see build_model) so training and serving share one implementation.
+    """
+    color_mode = 'grayscale' if IMG_CHANNELS == 1 else 'rgb'
+
     # Training data augmentation
     train_datagen = ImageDataGenerator(
-        rescale=1./255,
-        rotation_range=20,
-        width_shift_range=0.2,
-        height_shift_range=0.2,
+        rotation_range=ROTATION_DEGREES,
+        width_shift_range=SHIFT_RANGE,
+        height_shift_range=SHIFT_RANGE,
         horizontal_flip=True,
-        zoom_range=0.2,
-        fill_mode='nearest'
+        zoom_range=ZOOM_RANGE,
+        fill_mode='nearest',
+        dtype='uint8'
     )
     
-    # Validation data (only rescaling, no augmentation)
-    val_datagen = ImageDataGenerator(rescale=1./255)
+    # Validation data (no augmentation)
+    val_datagen = ImageDataGenerator(dtype='uint8')
     
     # Create generators
     train_generator = train_datagen.flow_from_directory(
         TRAIN_DIR,
         target_size=IMG_SIZE,
+        color_mode=color_mode,
         batch_size=BATCH_SIZE,
         class_mode='categorical',
         shuffle=True
@@ -86,6 +131,7 @@ def create_data_generators():
     val_generator = val_datagen.flow_from_directory(
         VAL_DIR,
         target_size=IMG_SIZE,
+        color_mode=color_mode,
         batch_size=BATCH_SIZE,
         class_mode='categorical',
         shuffle=False
@@ -94,20 +140,204 @@ def create_data_generators():
     return train_generator, val_generator
 
 
-def build_model(num_classes):
-    """Build a MobileNetV2-based model for spinal disease classification."""
+def random_affine(images, seed):
+    """
+    Batched in-graph equivalent of the ImageDataGenerator augmentation.
+
+    Draws a rotation, shift, independent x/y zoom and horizontal flip per
+    image within the training ranges, composes them into one affine matrix
+    and resamples the whole uint8 batch in a single projective-transform op
+    (bilinear, nearest fill, as ImageDataGenerator does).
+
+    Args:
+        images: uint8 batch of shape (batch, height, width, channels)
+        seed: Shape [2] integer seed for the whole batch, or shape
+            [batch, 2] with one seed per image; the same seed gives the same
+            transforms
+
+    Returns:
+        Augmented uint8 batch of the same shape
+    """
+    shape = tf.shape(images)
+    height = tf.cast(shape[1], tf.float32)
+    width = tf.cast(shape[2], tf.float32)
+
+    seed = tf.convert_to_tensor(seed)
+    if seed.shape.rank == 2:
+        # Per-image seeds: each image's transform is independent of its batch
+        draws = tf.map_fn(
+            lambda image_seed: tf.random.stateless_uniform([6], image_seed, -1.0, 1.0),
+            seed, fn_output_signature=tf.float32)
+    else:
+        draws = tf.random.stateless_uniform([shape[0], 6], seed, -1.0, 1.0)
+    angle = draws[:, 0] * np.deg2rad(ROTATION_DEGREES)
+    zoom_x = 1.0 + draws[:, 1] * ZOOM_RANGE
+    zoom_y = 1.0 + draws[:, 2] * ZOOM_RANGE
+    shift_x = draws[:, 3] * SHIFT_RANGE * width
+    shift_y = draws[:, 4] * SHIFT_RANGE * height
+    flip = tf.where(draws[:, 5] < 0, -1.0, 1.0)
+
+    # Output pixel -> input point: rotate/zoom/flip about the centre, then shift
+    cos, sin = tf.cos(angle), tf.sin(angle)
+    a0, a1 = cos * zoom_x * flip, -sin * zoom_y
+    b0, b1 = sin * zoom_x * flip, cos * zoom_y
+    center_x, center_y = (width - 1) / 2, (height - 1) / 2
+    a2 = center_x + shift_x - a0 * center_x - a1 * center_y
+    b2 = center_y + shift_y - b0 * center_x - b1 * center_y
+    zeros = tf.zeros_like(a0)
+
+    return tf.raw_ops.ImageProjectiveTransformV3(
+        images=images,
+        transforms=tf.stack([a0, a1, a2, b0, b1, b2, zeros, zeros], axis=1),
+        output_shape=shape[1:3],
+        fill_value=0.0,
+        interpolation='BILINEAR',
+        fill_mode='NEAREST',
+    )
+
+
+def _load_pixels(path):
+    """PIL decode + resize of one image file (runs inside tf.numpy_function)."""
+    return load_image_array(path.decode(), IMG_SIZE, channels=IMG_CHANNELS)
+
+
+def _decode_and_resize(path, label):
+    """
+    Read, decode and resize one image into uint8 pixels.
+
+    Uses the same PIL code as serving and the dataset shards:
+    tf.image.resize differs from it by up to several gray levels even with
+    antialias=True, which would bring back train/serve skew.
+    """
+    image = tf.numpy_function(_load_pixels, [path], tf.uint8)
+    return tf.ensure_shape(image, IMG_SIZE[::-1] + (IMG_CHANNELS,)), label
+
+
+def make_dataset(directory, class_names, training=False, cache=DATA_CACHE,
+                 batch_size=BATCH_SIZE, seed=SHUFFLE_SEED):
+    """
+    tf.data pipeline over one split: parallel decode/resize, cache, shuffle,
+    batch, augmentation (training only) and AUTOTUNE prefetch.
+
+    Images are decoded once; later epochs read uint8 tensors from the cache
+    (memory, or files under `cache` if given) and each batch is augmented by
+    random_affine with a seed drawn from `seed`, so runs are reproducible.
+    Labels are one-hot, as with class_mode='categorical'.
+
+    Returns:
+        Tuple of (tf.data.Dataset, integer class index per image in file order)
+    """
+    paths = list_images(directory)
+    if not paths:
+        raise FileNotFoundError(f"No images found in {directory}")
+    classes = np.array([class_names.index(p.parent.name) for p in paths])
+
+    dataset = tf.data.Dataset.from_tensor_slices(
+        ([str(p) for p in paths], tf.one_hot(classes, len(class_names))))
+    dataset = dataset.map(_decode_and_resize, num_parallel_calls=tf.data.AUTOTUNE)
+    if cache:
+        os.makedirs(os.path.dirname(cache) or '.', exist_ok=True)
+        split = os.path.basename(os.path.normpath(directory))
+        dataset = dataset.cache(f"{cache}_{split}")
+    else:
+        dataset = dataset.cache()
+    if training:
+        dataset = dataset.shuffle(len(paths), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    return _augment_and_prefetch(dataset, training, seed), classes
+
+
+def make_shard_dataset(split, class_names, training=False, batch_size=BATCH_SIZE,
+                       seed=SHUFFLE_SEED):
+    """
+    tf.data pipeline over a memory-mapped dataset shard (see dataset_shards).
+
+    Batches of (shuffled) indices are gathered straight from the memmap, so
+    nothing is decoded and only the pages of each batch's images are read.
+    Training batches are augmented as in make_dataset.
+
+    Returns:
+        Tuple of (tf.data.Dataset, integer class index per image in shard order)
+    """
+    pixels, classes, manifest = load_shard(split)
+    if manifest['class_names'] != class_names:
+        raise ValueError(f"Shard {split} classes {manifest['class_names']} != {class_names}")
+    labels = np.eye(len(class_names), dtype=np.float32)[classes]
+
+    def gather(indices):
+        indices = np.sort(indices)
+        return pixels[indices], labels[indices]
+
+    def load_batch(indices):
+        images, batch_labels = tf.numpy_function(gather, [indices], (tf.uint8, tf.float32))
+        return (tf.ensure_shape(images, (None,) + IMG_SIZE[::-1] + (IMG_CHANNELS,)),
+                tf.ensure_shape(batch_labels, (None, len(class_names))))
+
+    dataset = tf.data.Dataset.range(len(classes))
+    if training:
+        dataset = dataset.shuffle(len(classes), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size).map(load_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    return _augment_and_prefetch(dataset, training, seed), classes
+
+
+def _augment_and_prefetch(dataset, training, seed):
+    """Augment training batches with random_affine (seeded per batch) and prefetch."""
+    if training:
+        seeds = tf.data.Dataset.random(seed=seed, rerandomize_each_iteration=True).batch(2)
+        dataset = tf.data.Dataset.zip(dataset, seeds).map(
+            lambda batch, batch_seed: (random_affine(batch[0], batch_seed), batch[1]),
+            num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def create_datasets(cache=DATA_CACHE, shards=False):
+    """
+    tf.data alternative to create_data_generators.
+
+    Args:
+        cache: Decoded-image cache for the PNG pipeline (see make_dataset)
+        shards: Read the 'train'/'validation' dataset shards instead of PNGs
+
+    Returns:
+        Tuple of (train dataset, validation dataset, class names,
+        validation class indices)
+    """
+    class_names = class_names_from_directory(TRAIN_DIR)
+    if shards:
+        train_dataset, _ = make_shard_dataset('train', class_names, training=True)
+        val_dataset, val_classes = make_shard_dataset('validation', class_names)
+    else:
+        train_dataset, _ = make_dataset(TRAIN_DIR, class_names, training=True, cache=cache)
+        val_dataset, val_classes = make_dataset(VAL_DIR, class_names, cache=cache)
+    return train_dataset, val_dataset, class_names, val_classes
+
+
+def build_model(num_classes, weights='imagenet', channels=IMG_CHANNELS):
+    """
+    Build a MobileNetV2-based model for spinal disease classification.
+
+    The model takes raw uint8 pixels and rescales them to [0, 1] in-graph.
+    Single-channel (grayscale) input is replicated to the three channels
+    MobileNetV2 expects by a fixed 1x1 convolution, so grayscale data is
+    only ever expanded inside the graph.
+    """
     # Load pre-trained MobileNetV2
     base_model = MobileNetV2(
-        input_shape=(224, 224, 3),
+        input_shape=IMG_SIZE + (3,),
         include_top=False,
-        weights='imagenet'
+        weights=weights
     )
     
     # Freeze the base model
     base_model.trainable = False
     
     # Build the model
-    model = keras.Sequential([
+    inputs = [keras.Input(shape=IMG_SIZE + (channels,), dtype='uint8', name='image'),
+              layers.Rescaling(1./255)]
+    if channels == 1:
+        inputs.append(layers.Conv2D(3, 1, use_bias=False, kernel_initializer='ones',
+                                    trainable=False, name='grayscale_to_rgb'))
+    model = keras.Sequential(inputs + [
         base_model,
         layers.GlobalAveragePooling2D(),
         layers.Dense(128, activation='relu'),
@@ -125,6 +355,149 @@ def build_model(num_classes):
     return model
 
 
+def split_model(model):
+    """
+    Split a build_model classifier at its pooling layer.
+
+    Returns:
+        Tuple of (feature extractor: uint8 pixels -> pooled backbone
+        features, head: features -> class probabilities). Both share layer
+        objects with `model`, so training the head trains the full model.
+    """
+    pooling = next(index for index, layer in enumerate(model.layers)
+                   if isinstance(layer, layers.GlobalAveragePooling2D))
+    extractor = keras.Model(model.inputs, model.layers[pooling].output, name='features')
+    head = keras.Sequential([keras.Input(shape=extractor.output.shape[1:])]
+                            + model.layers[pooling + 1:], name='head')
+    return extractor, head
+
+
+def feature_fingerprint():
+    """Identify everything the cached backbone features depend on."""
+    return json.dumps({
+        'backbone': 'MobileNetV2/imagenet',
+        'keras': keras.__version__,
+        'img_size': IMG_SIZE,
+        'channels': IMG_CHANNELS,
+        'augmentation': [ROTATION_DEGREES, SHIFT_RANGE, ZOOM_RANGE, SHUFFLE_SEED],
+        'augmentation_seed': 'content_hash',
+    })
+
+
+def _content_seed(key, copy, seed=SHUFFLE_SEED):
+    """Stateless seed of augmented `copy` of the image with content hash `key`."""
+    return [seed + copy, int.from_bytes(bytes.fromhex(key[:16]), 'little', signed=True)]
+
+
+def cache_features(pixels, hashes, extractor, cache, copies=0, seed=SHUFFLE_SEED):
+    """
+    Run the backbone over every image (plus `copies` random_affine views of
+    it) whose features are not cached yet.
+
+    Each view is seeded from the image's content hash and copy number, so
+    it does not depend on which other images were already cached.
+
+    Args:
+        pixels: uint8 images (e.g. a memory-mapped dataset shard)
+        hashes: Content hash of each image (the cache key)
+    """
+    pending = {key: index for index, key in enumerate(hashes)
+               if any((key, copy) not in cache for copy in range(copies + 1))}
+    pending = list(pending.items())
+
+    for start in range(0, len(pending), FEATURE_BATCH_SIZE):
+        chunk = pending[start:start + FEATURE_BATCH_SIZE]
+        images = pixels[np.array([index for _, index in chunk])]
+        for copy in range(copies + 1):
+            keys = [(key, copy) for key, _ in chunk]
+            missing = [i for i, key in enumerate(keys) if key not in cache]
+            if not missing:
+                continue
+            views = images[missing]
+            if copy:
+                seeds = [_content_seed(keys[i][0], copy, seed) for i in missing]
+                views = random_affine(views, tf.constant(seeds, tf.int64)).numpy()
+            features = np.asarray(extractor.predict_on_batch(views))
+            cache.add([keys[i] for i in missing], features)
+
+
+def save_labels(class_labels, path=LABELS_PATH):
+    """Write `index label` lines in class index order."""
+    with open(path, 'w') as f:
+        for i, label in enumerate(class_labels):
+            f.write(f"{i} {label}\n")
+
+
+def fast_train(augment_copies=FEATURE_AUGMENT_COPIES, epochs=EPOCHS):
+    """
+    Train only the classifier head on cached backbone features.
+
+    The frozen backbone runs once per new image (and augmented copy); its
+    pooled features are cached in feature_cache (keyed by the content hashes
+    in the dataset shard manifests), the Dense/Dropout head is
+    fit on them, and the head, still attached to the backbone, is saved as
+    a full MODEL_SAVE_PATH checkpoint.
+    """
+    print("🏥 Fast training (cached backbone features)")
+    print("=" * 50)
+    check_dataset()
+    class_labels = class_names_from_directory(TRAIN_DIR)
+    model = build_model(len(class_labels))
+    extractor, head = split_model(model)
+    cache = FeatureCache(feature_fingerprint())
+
+    train_pixels, train_classes, train_manifest = load_shard('train')
+    val_pixels, val_classes, val_manifest = load_shard('validation')
+    train_hashes = [item['hash'] for item in train_manifest['items']]
+    val_hashes = [item['hash'] for item in val_manifest['items']]
+
+    cached_rows = len(cache)
+    start = time.perf_counter()
+    cache_features(train_pixels, train_hashes, extractor, cache, augment_copies)
+    cache_features(val_pixels, val_hashes, extractor, cache)
+    print(f"🧠 Backbone features: {len(cache) - cached_rows} computed, {cached_rows} cached "
+          f"({time.perf_counter() - start:.1f} s)")
+
+    x_train = cache.get([(key, copy) for key in train_hashes
+                         for copy in range(augment_copies + 1)])
+    y_train = keras.utils.to_categorical(np.repeat(train_classes, augment_copies + 1),
+                                         len(class_labels))
+    x_val = cache.get([(key, 0) for key in val_hashes])
+    y_val = keras.utils.to_categorical(val_classes, len(class_labels))
+
+    head.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=LEARNING_RATE),
+        loss='categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    callbacks = [
+        keras.callbacks.EarlyStopping(monitor='val_loss', patience=10,
+                                      restore_best_weights=True, verbose=1),
+        keras.callbacks.ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=5,
+                                          min_lr=1e-7, verbose=1),
+    ]
+    print(f"\n🚀 Training head on {len(x_train)} feature rows for up to {epochs} epochs...")
+    start = time.perf_counter()
+    head.fit(x_train, y_train, validation_data=(x_val, y_val), epochs=epochs,
+             batch_size=BATCH_SIZE, shuffle=True, callbacks=callbacks, verbose=2)
+    print(f"✅ Head trained in {time.perf_counter() - start:.1f} s")
+
+    model.save(MODEL_SAVE_PATH)
+    save_labels(class_labels)
+    print("\n✅ Model saved to:", MODEL_SAVE_PATH)
+    print("✅ Labels saved to:", LABELS_PATH)
+
+    # The saved model runs the backbone again, so it should reproduce the head
+    # (up to float16 feature rounding)
+    probabilities = predict_pixel_batches(val_pixels, model)
+    drift = np.max(np.abs(probabilities - head.predict(x_val, verbose=0)))
+    accuracy = np.mean(np.argmax(probabilities, axis=1) == val_classes)
+    print(f"\n✅ Validation Accuracy (full model): {accuracy*100:.2f}%")
+    print(f"✅ Max |Δp| full model vs. cached features: {drift:.2e}")
+    print("\n📊 Confusion Matrix:")
+    print(confusion_matrix(val_classes, np.argmax(probabilities, axis=1)))
+
+
 def plot_training_history(history):
     """Plot training and validation accuracy/loss."""
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 4))
@@ -152,8 +525,14 @@ def plot_training_history(history):
     print("\n✅ Training history plot saved to 'model/training_history.png'")
 
 
-def main():
-    """Main training function."""
+def main(pipeline='generator'):
+    """
+    Main training function.
+
+    Args:
+        pipeline: 'generator' (ImageDataGenerator), 'tfdata' (create_datasets
+            over the PNGs) or 'shards' (create_datasets over dataset shards)
+    """
     print("🏥 Spinal Disease Classifier Training")
     print("=" * 50)
     
@@ -172,12 +551,19 @@ def main():
         print("      └── abnormal/")
         return
     
-    # Create data generators
-    print("🔄 Creating data generators...")
-    train_generator, val_generator = create_data_generators()
+    # Create input pipelines
+    if pipeline in ('tfdata', 'shards'):
+        print("🔄 Creating tf.data pipelines...")
+        train_data, val_data, class_labels, true_classes = create_datasets(
+            shards=pipeline == 'shards')
+    else:
+        print("🔄 Creating data generators...")
+        train_data, val_data = create_data_generators()
+        class_labels = list(train_data.class_indices.keys())
+        true_classes = val_data.classes
     
-    num_classes = len(train_generator.class_indices)
-    print(f"\n🏷️  Classes: {list(train_generator.class_indices.keys())}")
+    num_classes = len(class_labels)
+    print(f"\n🏷️  Classes: {class_labels}")
     print(f"📊 Number of classes: {num_classes}")
     
     # Build model
@@ -216,8 +602,8 @@ def main():
     print("=" * 50)
     
     history = model.fit(
-        train_generator,
-        validation_data=val_generator,
+        train_data,
+        validation_data=val_data,
         epochs=EPOCHS,
         callbacks=callbacks,
         verbose=1
@@ -227,26 +613,23 @@ def main():
     plot_training_history(history)
     
     # Save class labels
-    class_labels = list(train_generator.class_indices.keys())
-    with open('model/labels.txt', 'w') as f:
-        for i, label in enumerate(class_labels):
-            f.write(f"{i} {label}\n")
+    save_labels(class_labels)
     
     print("\n✅ Model saved to:", MODEL_SAVE_PATH)
     print("✅ Labels saved to: model/labels.txt")
     
     # Evaluate on validation set
     print("\n📊 Evaluating model on validation set...")
-    val_loss, val_accuracy = model.evaluate(val_generator)
+    val_loss, val_accuracy = model.evaluate(val_data)
     print(f"\n✅ Validation Accuracy: {val_accuracy*100:.2f}%")
     print(f"✅ Validation Loss: {val_loss:.4f}")
     
     # Get predictions for confusion matrix
     print("\n🔍 Generating predictions for detailed analysis...")
-    val_generator.reset()
-    predictions = model.predict(val_generator, verbose=1)
+    if pipeline == 'generator':
+        val_data.reset()
+    predictions = model.predict(val_data, verbose=1)
     predicted_classes = np.argmax(predictions, axis=1)
-    true_classes = val_generator.classes
     
     # Print classification report
     print("\n📊 Classification Report:")
@@ -269,6 +652,207 @@ def main():
     print("   streamlit run main.py")
 
 
+def export_models(checkpoint=MODEL_SAVE_PATH):
+    """Export the Keras checkpoint as a SavedModel and a TFLite flatbuffer."""
+    if not os.path.exists(checkpoint):
+        raise FileNotFoundError(f"Checkpoint not found: {checkpoint}")
+
+    print(f"📦 Loading checkpoint: {checkpoint}")
+    model = keras.models.load_model(checkpoint)
+
+    print(f"📦 Exporting SavedModel to: {SAVEDMODEL_PATH}")
+    model.export(SAVEDMODEL_PATH)
+
+    print(f"📦 Converting to TFLite: {TFLITE_PATH}")
+    converter = tf.lite.TFLiteConverter.from_saved_model(SAVEDMODEL_PATH)
+    with open(TFLITE_PATH, 'wb') as f:
+        f.write(converter.convert())
+
+    print("\n✅ Export complete:")
+    for path in (checkpoint, SAVEDMODEL_PATH, TFLITE_PATH):
+        print(f"   {path}")
+
+
+def run_parity_check(tolerance=PARITY_TOLERANCE):
+    """Verify that all inference backends agree on the validation set."""
+    print(f"🔍 Checking backend parity on {VAL_DIR} (tolerance {tolerance:g})...")
+    pixels, _, _ = load_shard('validation')
+    report = check_parity(VAL_DIR, tolerance=tolerance, pixels=pixels)
+
+    print("=" * 50)
+    print(f"{'backend':<12} {'max |Δp|':>12} {'label agreement':>16}")
+    for name, result in report.items():
+        status = "✅" if result['ok'] else "❌"
+        print(f"{name:<12} {result['max_abs_diff']:>12.2e} "
+              f"{result['label_agreement']:>15.1%} {status}")
+    print("=" * 50)
+
+    if not all(result['ok'] for result in report.values()):
+        raise SystemExit("❌ Backends disagree beyond tolerance")
+    print("✅ All backends agree")
+
+
+def _model_inputs(pixels, dtype, channels):
+    """
+    uint8 pixels as the given model input dtype (scaled to [0, 1] if float)
+    and channel count (older checkpoints take RGB).
+    """
+    pixels = match_channels(np.asarray(pixels), channels)
+    if np.issubdtype(dtype, np.floating):
+        return pixels.astype(dtype) / 255.0
+    return pixels.astype(dtype, copy=False)
+
+
+def representative_dataset(num_samples=REPRESENTATIVE_SAMPLES, seed=42, dtype=np.uint8,
+                           channels=IMG_CHANNELS):
+    """Yield calibration inputs drawn from the training shard."""
+    pixels, _, _ = load_shard('train')
+    indices = list(range(len(pixels)))
+    random.Random(seed).shuffle(indices)
+    for index in indices[:num_samples]:
+        yield [_model_inputs(pixels[index:index + 1], dtype, channels)]
+
+
+def quantize_models():
+    """Write dynamic-range, float16 and full-integer TFLite variants."""
+    if not os.path.exists(SAVEDMODEL_PATH):
+        export_models()
+
+    saved_model = SavedModelBackend(SAVEDMODEL_PATH)
+    input_dtype, input_channels = saved_model.input_dtype, saved_model.input_channels
+    legacy_float_input = np.issubdtype(input_dtype, np.floating)
+
+    for variant, path in QUANTIZED_MODEL_PATHS.items():
+        print(f"⚙️  Quantizing ({variant}) -> {path}")
+        converter = tf.lite.TFLiteConverter.from_saved_model(SAVEDMODEL_PATH)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+        if variant == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+        elif variant == 'int8':
+            converter.representative_dataset = lambda: representative_dataset(
+                dtype=input_dtype, channels=input_channels)
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            # uint8-input models already take integer pixels
+            if legacy_float_input:
+                converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+
+        with open(path, 'wb') as f:
+            f.write(converter.convert())
+
+
+def _model_size_bytes(path):
+    """Size on disk of a model file or directory."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, files in os.walk(path) for name in files)
+
+
+def evaluate_tflite_variant(path, pixels, true_classes, class_labels):
+    """
+    Measure accuracy and single-image latency of one TFLite model.
+
+    Args:
+        pixels: uint8 validation images (e.g. the memory-mapped shard)
+
+    Returns:
+        Dict with accuracy, classification report, confusion matrix,
+        size on disk and p50/p99 single-image latency (ms)
+    """
+    backend = TFLiteBackend(path)
+    predictions = predict_pixel_batches(pixels, backend)
+    predicted_classes = np.argmax(predictions, axis=1)
+
+    # Single-image latency over the validation set (after one warm-up call)
+    dtype, channels = model_input_dtype(backend), model_input_channels(backend)
+    inputs = [_model_inputs(pixels[i:i + 1], dtype, channels) for i in range(len(pixels))]
+    backend.predict(inputs[0])
+    latencies = []
+    for image in inputs:
+        start = time.perf_counter()
+        backend.predict(image)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+    return {
+        'path': path,
+        'size_bytes': _model_size_bytes(path),
+        'accuracy': float(np.mean(predicted_classes == true_classes)),
+        'classification_report': classification_report(
+            true_classes, predicted_classes, labels=list(range(len(class_labels))),
+            target_names=class_labels, output_dict=True, zero_division=0),
+        'confusion_matrix': confusion_matrix(
+            true_classes, predicted_classes,
+            labels=list(range(len(class_labels)))).tolist(),
+        'latency_p50_ms': float(np.percentile(latencies, 50)),
+        'latency_p99_ms': float(np.percentile(latencies, 99)),
+    }
+
+
+def run_quantization():
+    """Quantize the checkpoint and report latency versus accuracy per variant."""
+    print("🏥 Post-training quantization")
+    print("=" * 50)
+    if not os.path.exists(TFLITE_PATH):
+        export_models()
+    quantize_models()
+
+    class_labels = load_labels(LABELS_PATH)
+    pixels, _, manifest = load_shard('validation')
+    true_classes = np.array([class_labels.index(manifest['class_names'][item['label']])
+                             for item in manifest['items']])
+
+    variants = {'float32': TFLITE_PATH, **QUANTIZED_MODEL_PATHS}
+    report = {}
+    for variant, path in variants.items():
+        print(f"\n📊 Evaluating {variant} on {VAL_DIR}...")
+        report[variant] = evaluate_tflite_variant(path, pixels, true_classes, class_labels)
+        print(f"Confusion Matrix:\n{np.array(report[variant]['confusion_matrix'])}")
+
+    with open(QUANTIZATION_REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print("\n📊 Latency vs. accuracy:")
+    print("=" * 72)
+    print(f"{'variant':<15} {'accuracy':>9} {'macro F1':>9} {'size (MB)':>10} "
+          f"{'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for variant, result in report.items():
+        macro_f1 = result['classification_report']['macro avg']['f1-score']
+        print(f"{variant:<15} {result['accuracy']:>9.2%} {macro_f1:>9.3f} "
+              f"{result['size_bytes'] / 1e6:>10.2f} {result['latency_p50_ms']:>9.2f} "
+              f"{result['latency_p99_ms']:>9.2f}")
+    print("=" * 72)
+    print(f"\n✅ Full report saved to: {QUANTIZATION_REPORT_PATH}")
+
+
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Spinal Disease Classifier training")
+    parser.add_argument('command', nargs='?', default='train',
+                        choices=['train', 'fast-train', 'export', 'parity', 'quantize'],
+                        help="train (default), train only the head on cached "
+                             "backbone features, export the checkpoint to all "
+                             "inference formats, check backend parity, or build "
+                             "and evaluate quantized TFLite variants")
+    parser.add_argument('--tolerance', type=float, default=PARITY_TOLERANCE,
+                        help="Parity tolerance (max absolute probability difference)")
+    parser.add_argument('--pipeline', choices=['generator', 'tfdata', 'shards'],
+                        default='generator',
+                        help="Training input pipeline: ImageDataGenerator, tf.data over "
+                             "the PNGs (parallel decode, cached, batched in-graph "
+                             "augmentation) or tf.data over the dataset shards")
+    parser.add_argument('--augment-copies', type=int, default=FEATURE_AUGMENT_COPIES,
+                        help="fast-train: augmented copies of each training image")
+    args = parser.parse_args()
+
+    if args.command == 'fast-train':
+        fast_train(args.augment_copies)
+    elif args.command == 'export':
+        export_models()
+    elif args.command == 'parity':
+        run_parity_check(args.tolerance)
+    elif args.command == 'quantize':
+        run_quantization()
+    else:
+        main(args.pipeline)
 
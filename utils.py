@@ -1,56 +1,414 @@
+import hashlib
+from pathlib import Path
+
 import numpy as np
 from PIL import Image
 
-def classify(image, model, class_names):
+import metrics
+
+# Model input resolution (width, height)
+IMG_SIZE = (224, 224)
+
+# Channels the MRI dataset is stored in and new models take (grayscale). The
+# model replicates them to the 3 channels MobileNetV2 expects in-graph;
+# older checkpoints take 3-channel RGB (see model_input_channels)
+IMG_CHANNELS = 1
+
+# File extensions treated as images when walking a directory
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Default number of images per forward pass for batched scoring
+DEFAULT_BATCH_SIZE = 32
+
+# Test-time augmentation views as (horizontal_flip, shift_x, shift_y, zoom).
+# Shifts are fractions of the image size; all values stay inside the
+# training augmentation ranges (train_model.create_data_generators).
+TTA_VIEWS = [
+    (False, 0.0, 0.0, 1.0),
+    (True, 0.0, 0.0, 1.0),
+    (False, 0.1, 0.0, 1.0),
+    (False, -0.1, 0.0, 1.0),
+    (False, 0.0, 0.1, 1.0),
+    (False, 0.0, -0.1, 1.0),
+    (False, 0.0, 0.0, 1.1),
+    (False, 0.0, 0.0, 0.9),
+    (True, 0.1, 0.0, 1.0),
+    (True, -0.1, 0.0, 1.0),
+    (True, 0.0, 0.0, 1.1),
+    (True, 0.0, 0.0, 0.9),
+]
+
+
+def list_images(directory):
+    """Return the sorted paths of all images under `directory` (recursive)."""
+    return sorted(p for p in Path(directory).rglob('*')
+                  if p.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def file_hash(path):
+    """Content hash (hex) of a file."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_labels(labels_path):
+    """Read class names from a labels file with lines like "0 with_pain"."""
+    with open(labels_path, 'r') as f:
+        return [line.strip().split(' ', 1)[1] for line in f if line.strip()]
+
+
+def _load_image(image, target_size=IMG_SIZE, channels=3):
+    """
+    Decode (if needed) and resize an image to the model input resolution.
+
+    Args:
+        image: PIL Image object or path to an image file
+        target_size: Tuple of (width, height) for resizing
+        channels: 1 for grayscale ('L'), 3 for RGB
+
+    Returns:
+        Resized PIL Image in mode 'L' or 'RGB'
+    """
+    mode = 'L' if channels == 1 else 'RGB'
+    with metrics.stage('decode'):
+        if not isinstance(image, Image.Image):
+            image = Image.open(image)
+        if image.mode != mode:
+            image = image.convert(mode)
+        else:
+            image.load()
+    with metrics.stage('resize'):
+        return image.resize(target_size)
+
+
+def load_image_array(image, target_size=IMG_SIZE, channels=3):
+    """Decode and resize an image into a uint8 (height, width, channels) array."""
+    pixels = np.asarray(_load_image(image, target_size, channels))
+    return pixels[..., np.newaxis] if channels == 1 else pixels
+
+
+def match_channels(pixels, channels):
+    """
+    Convert a uint8 NHWC batch to `channels` channels.
+
+    Grayscale is replicated to RGB; RGB is reduced to luminance with PIL's
+    'L' conversion weights (exact when the three channels are equal).
+    """
+    if pixels.shape[-1] == channels:
+        return pixels
+    if channels == 3:
+        return np.repeat(pixels, 3, axis=-1)
+    weights = np.array([19595, 38470, 7471], dtype=np.uint32)
+    gray = (pixels.astype(np.uint32) @ weights + 0x8000) >> 16
+    return gray.astype(np.uint8)[..., np.newaxis]
+
+
+def _predict(model, batch):
+    """
+    Run a single forward pass over a batch.
+
+    Keras models are called through `predict_on_batch`, which skips the
+    data-adapter and predict-loop setup that `model.predict` pays per call.
+    Any other object exposing `predict(batch)` is called directly.
+    """
+    metrics.increment('images_scored_total', len(batch))
+    with metrics.stage('predict'):
+        predict_on_batch = getattr(model, 'predict_on_batch', None)
+        if predict_on_batch is not None:
+            return np.asarray(predict_on_batch(batch))
+        return np.asarray(model.predict(batch))
+
+
+def model_input_dtype(model):
+    """
+    Return the NumPy dtype a model expects as input.
+
+    Current checkpoints take raw uint8 pixels and rescale inside the graph;
+    older checkpoints take float32 pixels already scaled to [0, 1].
+
+    Args:
+        model: Keras model or any object with an `input_dtype` attribute
+
+    Returns:
+        np.dtype (float32 when it cannot be determined)
+    """
+    dtype = getattr(model, 'input_dtype', None)
+    if dtype is None:
+        try:
+            dtype = model.inputs[0].dtype
+        except (AttributeError, IndexError, TypeError, ValueError):
+            dtype = 'float32'
+    return np.dtype(getattr(dtype, 'as_numpy_dtype', dtype))
+
+
+def model_input_channels(model):
+    """
+    Return the number of image channels a model takes.
+
+    Current checkpoints take single-channel grayscale pixels; older ones
+    take RGB.
+
+    Args:
+        model: Keras model or any object with an `input_channels` attribute
+
+    Returns:
+        int (3 when it cannot be determined)
+    """
+    channels = getattr(model, 'input_channels', None)
+    if channels is None:
+        try:
+            channels = model.inputs[0].shape[-1]
+        except (AttributeError, IndexError, TypeError, ValueError):
+            channels = None
+    return int(channels or 3)
+
+
+def predict_pixels(pixels, model):
+    """
+    Run one forward pass over an already decoded uint8 NHWC batch.
+
+    Args:
+        pixels: uint8 array of shape (N, height, width, 1 or 3); converted
+            to the model's channel count if they differ
+        model: Trained Keras model or any object exposing `predict(batch)`
+
+    Returns:
+        NumPy array of class probabilities, shape (N, num_classes)
+    """
+    pixels = match_channels(pixels, model_input_channels(model))
+    if np.issubdtype(model_input_dtype(model), np.floating):
+        pixels = pixels.astype(np.float32) / 255.0
+    return _predict(model, pixels)
+
+
+def predict_pixel_batches(pixels, model, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Score a decoded uint8 NHWC array (e.g. a memory-mapped dataset shard)
+    `batch_size` images at a time, reading each chunk only when it is scored.
+
+    Returns:
+        NumPy array of class probabilities, shape (N, num_classes)
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be >= 1, got {batch_size}")
+    return np.concatenate([predict_pixels(np.asarray(pixels[start:start + batch_size]), model)
+                           for start in range(0, len(pixels), batch_size)], axis=0)
+
+
+def predict_batch(images, model, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Compute class probabilities for a sequence of images, one forward pass
+    per chunk.
+
+    Images are decoded (with the model's channel count) and resized into a
+    preallocated uint8 NHWC buffer and scored `batch_size` at a time. Models
+    that rescale in-graph receive the uint8 pixels directly (a single image
+    is passed as a view of the decoded array, without a buffer copy); legacy
+    float-input checkpoints get the buffer normalized into a preallocated
+    float32 buffer.
+
+    Args:
+        images: Sequence of PIL Image objects and/or image file paths
+        model: Trained Keras model or any object exposing `predict(batch)`
+            (see inference.InferenceEngine and backends)
+        batch_size: Maximum number of images per forward pass
+
+    Returns:
+        NumPy array of class probabilities, shape (N, num_classes), in input order
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be >= 1, got {batch_size}")
+
+    images = list(images)
+    if not images:
+        return np.empty((0, 0), dtype=np.float32)
+
+    normalize = np.issubdtype(model_input_dtype(model), np.floating)
+    channels = model_input_channels(model)
+
+    width, height = IMG_SIZE
+    capacity = min(batch_size, len(images))
+    shape = (capacity, height, width, channels)
+    pixels = np.empty(shape, dtype=np.uint8) if capacity > 1 else None
+    data = np.empty(shape, dtype=np.float32) if normalize else None
+
+    predictions = []
+    for start in range(0, len(images), capacity):
+        chunk = images[start:start + capacity]
+        count = len(chunk)
+
+        if pixels is None:
+            batch = load_image_array(chunk[0], channels=channels)[np.newaxis]
+        else:
+            # Decode + resize straight into the uint8 buffer
+            for i, image in enumerate(chunk):
+                pixels[i] = load_image_array(image, channels=channels)
+            batch = pixels[:count]
+
+        if normalize:
+            # Legacy float-input checkpoint: scale to [0, 1] without a new array
+            np.multiply(batch, np.float32(1.0 / 255.0), out=data[:count])
+            batch = data[:count]
+
+        predictions.append(_predict(model, batch))
+
+    return np.concatenate(predictions, axis=0)
+
+
+def classify_batch(images, model, class_names, batch_size=DEFAULT_BATCH_SIZE, cache=None):
+    """
+    Classify a sequence of images, running one forward pass per chunk.
+
+    Args:
+        images: Sequence of PIL Image objects and/or image file paths
+        model: Trained Keras model or any object exposing `predict(batch)`
+        class_names: List of class names
+        batch_size: Maximum number of images per forward pass
+        cache: Optional prediction_cache.PredictionCache; cached images
+            skip the model and only misses are scored
+
+    Returns:
+        List of (predicted_class_name, confidence_score) tuples, in input order
+    """
+    images = list(images)
+    results = [None] * len(images)
+    pending = list(range(len(images)))
+
+    if cache is not None:
+        # Decode once so the pixel hash and the forward pass share the image
+        images = [image if isinstance(image, Image.Image) else Image.open(image)
+                  for image in images]
+        keys = [cache.key_for(image) for image in images]
+        pending = []
+        for i, key in enumerate(keys):
+            results[i] = cache.get(key)
+            if results[i] is None:
+                pending.append(i)
+
+    if pending:
+        prediction = predict_batch([images[i] for i in pending], model, batch_size=batch_size)
+        indices = np.argmax(prediction, axis=1)
+        for i, row, index in zip(pending, prediction, indices):
+            results[i] = (class_names[index], row[index])
+            if cache is not None:
+                cache.put(keys[i], *results[i])
+
+    return results
+
+
+def classify(image, model, class_names, cache=None):
     """
     Classify an image using the trained model.
-    
+
     Args:
         image: PIL Image object
-        model: Trained Keras model
+        model: Trained Keras model or any object exposing `predict(batch)`
         class_names: List of class names
-    
+        cache: Optional prediction_cache.PredictionCache checked before the model
+
     Returns:
         Tuple of (predicted_class_name, confidence_score)
     """
-    # Resize image to 224x224
-    image = image.resize((224, 224))
-    
-    # Convert to array and normalize
-    image_array = np.asarray(image)
-    
-    # Normalize pixel values to [0, 1]
-    normalized_image_array = image_array.astype(np.float32) / 255.0
-    
-    # Add batch dimension
-    data = np.expand_dims(normalized_image_array, axis=0)
-    
-    # Make prediction
-    prediction = model.predict(data, verbose=0)
-    
-    # Get the predicted class index and confidence
-    index = np.argmax(prediction)
-    class_name = class_names[index]
-    confidence_score = prediction[0][index]
-    
-    return class_name, confidence_score
+    return classify_batch([image], model, class_names, batch_size=1, cache=cache)[0]
+
+
+def _augmented_view(pixels, flip, shift_x, shift_y, zoom, out):
+    """
+    Write one flipped/shifted/zoomed view of `pixels` into `out`.
+
+    Uses nearest-neighbour sampling with edge replication, matching
+    ImageDataGenerator's fill_mode='nearest'. The transform is separable,
+    so it is a single fancy-indexing gather.
+    """
+    height, width = pixels.shape[:2]
+    rows = (np.arange(height) - (height - 1) / 2) / zoom + (height - 1) / 2 - shift_y * height
+    cols = (np.arange(width) - (width - 1) / 2) / zoom + (width - 1) / 2 - shift_x * width
+    rows = np.clip(np.rint(rows), 0, height - 1).astype(np.intp)
+    cols = np.clip(np.rint(cols), 0, width - 1).astype(np.intp)
+    if flip:
+        cols = cols[::-1]
+    out[...] = pixels[np.ix_(rows, cols)]
+
+
+def tta_views(pixels, views=len(TTA_VIEWS)):
+    """
+    Build augmented views of one image.
+
+    Args:
+        pixels: uint8 array of shape (height, width, channels)
+        views: Number of views (the first is always the unmodified image)
+
+    Returns:
+        uint8 array of shape (views, height, width, channels)
+    """
+    if not 1 <= views <= len(TTA_VIEWS):
+        raise ValueError(f"views must be between 1 and {len(TTA_VIEWS)}, got {views}")
+    batch = np.empty((views,) + pixels.shape, dtype=np.uint8)
+    for out, params in zip(batch, TTA_VIEWS[:views]):
+        _augmented_view(pixels, *params, out=out)
+    return batch
+
+
+def classify_tta(image, model, class_names, views=8, threshold=None):
+    """
+    Classify an image with test-time augmentation in one batched forward pass.
+
+    Args:
+        image: PIL Image object or path to an image file
+        model: Trained Keras model or any object exposing `predict(batch)`
+        class_names: List of class names
+        views: Number of augmented views scored together
+        threshold: If set, score the plain image first and only run TTA when
+            its confidence is below `threshold`
+
+    Returns:
+        Dict with keys:
+            class_name: Predicted class (argmax of the averaged probabilities)
+            confidence: Averaged probability of the predicted class
+            probabilities: Averaged class probabilities
+            disagreement: Fraction of views whose own prediction differs
+            views: Number of views scored (1 if TTA was skipped)
+    """
+    pixels = load_image_array(image, channels=model_input_channels(model))
+
+    if threshold is not None:
+        first = predict_pixels(pixels[np.newaxis], model)[0]
+        index = int(np.argmax(first))
+        if first[index] >= threshold:
+            return {'class_name': class_names[index], 'confidence': float(first[index]),
+                    'probabilities': first, 'disagreement': 0.0, 'views': 1}
+
+    prediction = predict_pixels(tta_views(pixels, views), model)
+    probabilities = prediction.mean(axis=0)
+    index = int(np.argmax(probabilities))
+    disagreement = float(np.mean(np.argmax(prediction, axis=1) != index))
+
+    return {'class_name': class_names[index], 'confidence': float(probabilities[index]),
+            'probabilities': probabilities, 'disagreement': disagreement, 'views': views}
 
 
-def preprocess_image(image_path, target_size=(224, 224)):
+def preprocess_image(image_path, target_size=(224, 224), dtype=np.float32, channels=3):
     """
     Load and preprocess an image for model input.
     
     Args:
         image_path: Path to the image file
         target_size: Tuple of (height, width) for resizing
+        dtype: Model input dtype (see model_input_dtype). uint8 returns the
+            raw pixels for models that rescale in-graph; float32 (legacy
+            checkpoints) returns pixels scaled to [0, 1]
+        channels: Model input channels (see model_input_channels); pass
+            IMG_CHANNELS (or model_input_channels(model)) for grayscale models
     
     Returns:
         Preprocessed image array
     """
-    img = Image.open(image_path).convert('RGB')
-    img = img.resize(target_size)
-    img_array = np.asarray(img)
-    img_array = img_array.astype(np.float32) / 255.0
+    img_array = load_image_array(image_path, target_size, channels)
+    if np.issubdtype(dtype, np.floating):
+        img_array = img_array.astype(np.float32) / 255.0
     
     return img_array
 
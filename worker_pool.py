@@ -0,0 +1,289 @@
+"""
+Multi-process inference worker pool for the Spinal Disease Classifier
+Each worker loads the model once with its own intra-/inter-op thread counts;
+pixels travel through shared-memory slots instead of being pickled
+
+Usage:
+    with WorkerPool(workers=2, intra_op_threads=2) as pool:
+        probabilities = predict_pixels(pixels, pool)
+"""
+
+import math
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils import IMG_CHANNELS, IMG_SIZE, predict_pixels
+
+# Images per shared-memory slot (the largest sub-batch a worker receives)
+SLOT_SIZE = 32
+
+# Seconds to wait for workers to load the model
+STARTUP_TIMEOUT = 300
+
+# Seconds between checks that every worker process is still alive
+HEALTH_CHECK_INTERVAL = 1.0
+
+
+def _slot_shape(slot_size, channels):
+    width, height = IMG_SIZE
+    return (slot_size, height, width, channels)
+
+
+def _configure_threads(backend, intra_op_threads, inter_op_threads):
+    """Pin this process's math-library and TensorFlow thread pools."""
+    os.environ['OMP_NUM_THREADS'] = str(intra_op_threads)
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(intra_op_threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = str(inter_op_threads)
+    if backend == 'tflite':
+        return {'num_threads': intra_op_threads}
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    return {}
+
+
+def _worker_main(backend, model_path, intra_op_threads, inter_op_threads,
+                 slot_names, slot_size, channels, tasks, results):
+    """Worker process: load the model once, then score slots until told to stop."""
+    try:
+        from backends import load_backend
+
+        options = _configure_threads(backend, intra_op_threads, inter_op_threads)
+        model = load_backend(backend, model_path, **options)
+        slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+        views = [np.ndarray(_slot_shape(slot_size, channels), dtype=np.uint8, buffer=slot.buf)
+                 for slot in slots]
+    except Exception as e:
+        results.put(('error', None, None, repr(e)))
+        return
+
+    results.put(('ready', os.getpid(), None, None))
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, slot, count = task
+        try:
+            probabilities = predict_pixels(views[slot][:count], model)
+            results.put((task_id, slot, probabilities, None))
+        except Exception as e:
+            results.put((task_id, slot, None, repr(e)))
+
+    del views
+    for slot in slots:
+        slot.close()
+
+
+class WorkerPool:
+    """
+    Pool of inference processes sharing a set of shared-memory image slots.
+
+    Exposes `predict(batch)` like the inference backends, so it can be passed
+    anywhere a model is accepted (utils.predict_pixels, score_images, serve).
+    A batch is split across the workers and scored in parallel. If a worker
+    process dies (e.g. OOM), outstanding futures fail and the pool refuses
+    new batches instead of waiting forever.
+
+    Args:
+        backend: Backend name loaded in every worker ('keras', 'savedmodel', 'tflite')
+        model_path: Model artifact (defaults to the backend's standard path)
+        workers: Number of worker processes
+        intra_op_threads: Intra-op (TFLite: interpreter) threads per worker
+        inter_op_threads: Inter-op threads per worker
+        slot_size: Maximum images per task
+        slots: Number of shared-memory slots (defaults to 2 per worker)
+        channels: Image channels held in the slots (workers convert them to
+            their model's channel count if it differs)
+    """
+
+    # Workers receive raw pixels and normalize them themselves if needed
+    input_dtype = np.dtype(np.uint8)
+
+    def __init__(self, backend='keras', model_path=None, workers=2, intra_op_threads=1,
+                 inter_op_threads=1, slot_size=SLOT_SIZE, slots=None, channels=IMG_CHANNELS):
+        self.backend = backend
+        self.workers = workers
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.slot_size = slot_size
+        self.input_channels = channels
+
+        shape = _slot_shape(slot_size, channels)
+        nbytes = int(np.prod(shape))
+        self._slots = [shared_memory.SharedMemory(create=True, size=nbytes)
+                       for _ in range(slots or 2 * workers)]
+        self._views = [np.ndarray(shape, dtype=np.uint8, buffer=slot.buf)
+                       for slot in self._slots]
+        self._free_slots = queue.Queue()
+        for index in range(len(self._slots)):
+            self._free_slots.put(index)
+
+        # spawn: forking a process that has already initialized TF is unsafe
+        context = mp.get_context('spawn')
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._processes = [
+            context.Process(
+                target=_worker_main, daemon=True,
+                args=(backend, model_path, intra_op_threads, inter_op_threads,
+                      [slot.name for slot in self._slots], slot_size, channels,
+                      self._tasks, self._results))
+            for _ in range(workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+        self._futures = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._error = None
+
+        try:
+            self._wait_ready()
+        except Exception:
+            self.close()
+            raise
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def _wait_ready(self):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        ready = 0
+        while ready < len(self._processes):
+            try:
+                status, _, _, error = self._results.get(timeout=HEALTH_CHECK_INTERVAL)
+            except queue.Empty:
+                dead = next((p for p in self._processes if p.exitcode is not None), None)
+                if dead is not None:
+                    raise RuntimeError(f"Inference worker (pid {dead.pid}) exited "
+                                       f"with code {dead.exitcode} while starting")
+                if time.monotonic() > deadline:
+                    raise TimeoutError("Inference workers did not start in time")
+                continue
+            if status == 'error':
+                raise RuntimeError(f"Inference worker failed to start: {error}")
+            ready += 1
+
+    def _collect(self):
+        """Resolve futures as workers report results; runs on a daemon thread."""
+        last_check = time.monotonic()
+        while True:
+            if time.monotonic() - last_check >= HEALTH_CHECK_INTERVAL:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                message = self._results.get(timeout=HEALTH_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            if message is None:
+                return
+            task_id, slot, probabilities, error = message
+            with self._lock:
+                entry = self._futures.pop(task_id, None)
+            if entry is None:
+                # Already failed because a worker died
+                continue
+            future, _ = entry
+            self._free_slots.put(slot)
+            if error is None:
+                future.set_result(probabilities)
+            else:
+                future.set_exception(RuntimeError(error))
+
+    def _check_workers(self):
+        """
+        Fail every outstanding future if a worker process died (OOM, crash).
+
+        Tasks are taken from a shared queue, so the dead worker's tasks cannot
+        be told apart; the pool is marked broken and later submits raise.
+        """
+        if self._closed or self._error is not None:
+            return
+        dead = next((p for p in self._processes if p.exitcode is not None), None)
+        if dead is None:
+            return
+        error = RuntimeError(f"Inference worker (pid {dead.pid}) exited "
+                             f"with code {dead.exitcode}")
+        with self._lock:
+            self._error = error
+            entries = list(self._futures.values())
+            self._futures.clear()
+        for future, slot in entries:
+            self._free_slots.put(slot)
+            future.set_exception(error)
+
+    def submit(self, pixels):
+        """
+        Queue one uint8 NHWC batch (at most `slot_size` images).
+
+        Blocks while every slot is in use, which bounds memory and applies
+        backpressure to the caller.
+
+        Returns:
+            concurrent.futures.Future resolving to class probabilities
+        """
+        if self._closed:
+            raise RuntimeError("WorkerPool is closed")
+        if self._error is not None:
+            raise self._error
+        count = len(pixels)
+        if count > self.slot_size:
+            raise ValueError(f"Batch of {count} exceeds slot size {self.slot_size}")
+
+        slot = self._free_slots.get()
+        self._views[slot][:count] = pixels
+
+        future = Future()
+        with self._lock:
+            if self._error is not None:
+                self._free_slots.put(slot)
+                raise self._error
+            task_id = self._next_id
+            self._next_id += 1
+            self._futures[task_id] = (future, slot)
+        self._tasks.put((task_id, slot, count))
+        return future
+
+    def predict(self, batch):
+        """Score a uint8 NHWC batch, split evenly across the workers."""
+        batch = np.asarray(batch, dtype=np.uint8)
+        if not len(batch):
+            return np.empty((0, 0), dtype=np.float32)
+        chunk = min(self.slot_size, math.ceil(len(batch) / self.workers))
+        futures = [self.submit(batch[start:start + chunk])
+                   for start in range(0, len(batch), chunk)]
+        return np.concatenate([future.result() for future in futures], axis=0)
+
+    def close(self):
+        """Stop the workers and release the shared memory."""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
+
+        self._views = []
+        for slot in self._slots:
+            slot.close()
+            slot.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()